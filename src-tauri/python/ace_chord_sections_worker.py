@@ -73,6 +73,12 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="Save raw root logits to a binary file sidecar.",
     )
+    parser.add_argument(
+        "--batch-chunks",
+        type=int,
+        default=8,
+        help="Chunks per model forward pass; features for the whole track are computed up front (1 = serial).",
+    )
     parser.add_argument(
         "--min-chord-dur",
         type=float,
@@ -139,6 +145,135 @@ def predict_logits(
     return root_logits, bass_logits, chord_logits
 
 
+def _as_model_input(features: torch.Tensor) -> torch.Tensor:
+    # Ensure shape [1, 1, F, T]
+    if features.ndim == 2:
+        features = features.unsqueeze(0).unsqueeze(0)
+    elif features.ndim == 3:
+        features = features.unsqueeze(0)
+    return features
+
+
+@torch.no_grad()
+def predict_logits_batch(
+    model: torch.nn.Module, batch: List[torch.Tensor]
+) -> List[Tuple[torch.Tensor, torch.Tensor, torch.Tensor]]:
+    """
+    batch: same-shaped [1, 1, F, T] chunk features, run as one forward pass.
+    returns: per chunk (root_logits [T, 13], bass_logits [T, 13], chord_logits [T, 12])
+    """
+    device = next(model.parameters()).device
+    outputs = model(torch.cat(batch, dim=0).to(device))
+    return [
+        (outputs["root"][i], outputs["bass"][i], outputs["onehot"][i])
+        for i in range(len(batch))
+    ]
+
+
+def _serial_chunk_logits(
+    model: torch.nn.Module,
+    chunker,
+    duration: float,
+    hop_seconds: float,
+    timeline_time: float,
+    max_chunks: int,
+):
+    """One chunk per forward pass; each onset follows the previous chunk's predictions."""
+    for _ in range(max_chunks):
+        if timeline_time - duration > hop_seconds:
+            break
+        features = chunker.process_chunk(onset=timeline_time)
+        if features is None:
+            break
+        root_logits, bass_logits, chord_logits = predict_logits(model, _as_model_input(features))
+        yield timeline_time, root_logits, bass_logits, chord_logits
+        timeline_time += root_logits.shape[0] * hop_seconds
+
+
+def _warn_serial_fallback(onset: float, predicted: int, frames: int) -> None:
+    print(
+        f"[ace] model predicted {predicted} frames for {frames} feature frames "
+        f"at {onset:.2f}s; continuing with --batch-chunks 1",
+        file=sys.stderr,
+        flush=True,
+    )
+
+
+def iter_chunk_logits(
+    model: torch.nn.Module,
+    chunker,
+    duration: float,
+    chunk_dur: float,
+    hop_seconds: float,
+    batch_chunks: int = 1,
+):
+    """
+    Walk the track chunk by chunk, yielding (timeline_time, root, bass, chord logits).
+
+    Each chunk starts where the previous one's predictions ended. With
+    batch_chunks > 1 the CQT features for every chunk are computed first
+    (onsets advance by feature frames), then same-shaped chunks are stacked
+    into batches for the model. That only holds while the model predicts
+    one frame per feature frame, so the first chunk is run alone to check
+    it; on any mismatch the rest of the track falls back to the serial walk.
+    """
+    max_chunks = int(np.ceil(duration / chunk_dur)) + 2
+
+    if batch_chunks <= 1:
+        yield from _serial_chunk_logits(model, chunker, duration, hop_seconds, 0.0, max_chunks)
+        return
+
+    features = chunker.process_chunk(onset=0.0)
+    if features is None:
+        return
+    features = _as_model_input(features)
+    logits = predict_logits(model, features)
+    yield (0.0, *logits)
+    timeline_time = logits[0].shape[0] * hop_seconds
+    if logits[0].shape[0] != features.shape[-1]:
+        _warn_serial_fallback(0.0, logits[0].shape[0], features.shape[-1])
+        yield from _serial_chunk_logits(
+            model, chunker, duration, hop_seconds, timeline_time, max_chunks - 1
+        )
+        return
+
+    chunks: List[Tuple[float, torch.Tensor]] = []
+    for _ in range(max_chunks - 1):
+        if timeline_time - duration > hop_seconds:
+            break
+        features = chunker.process_chunk(onset=timeline_time)
+        if features is None:
+            break
+        features = _as_model_input(features)
+        chunks.append((timeline_time, features))
+        timeline_time += features.shape[-1] * hop_seconds
+
+    start = 0
+    while start < len(chunks):
+        # Consecutive chunks of equal shape (a short final chunk runs alone).
+        end = start + 1
+        while (
+            end < len(chunks)
+            and end - start < batch_chunks
+            and chunks[end][1].shape == chunks[start][1].shape
+        ):
+            end += 1
+        group = chunks[start:end]
+        for (onset, features), logits in zip(
+            group, predict_logits_batch(model, [f for _, f in group])
+        ):
+            if logits[0].shape[0] != features.shape[-1]:
+                # Later onsets were laid out assuming one prediction per
+                # feature frame; redo the track from here serially.
+                _warn_serial_fallback(onset, logits[0].shape[0], features.shape[-1])
+                yield from _serial_chunk_logits(
+                    model, chunker, duration, hop_seconds, onset, max_chunks
+                )
+                return
+            yield (onset, *logits)
+        start = end
+
+
 def merge_identical_consecutive(intervals: np.ndarray, labels: List[str]):
     if len(labels) == 0:
         return intervals, labels
@@ -201,11 +336,15 @@ def main() -> int:
         # Mixdown logic if multiple files
         if len(args.audio_files) > 1:
             try:
-                # Load first file to establish sr/length
-                y_sum, sr = librosa.load(str(args.audio_files[0]), sr=args.sample_rate, mono=True)
+                import audio_cache
+
+                # Load first file to establish sr/length. Stems come from the
+                # shared PCM cache, so re-runs skip decode + resample.
+                sr = args.sample_rate
+                y_sum = np.array(audio_cache.load(args.audio_files[0], sr), dtype=np.float32)
                 
                 for other_path in args.audio_files[1:]:
-                    y_next, _ = librosa.load(str(other_path), sr=args.sample_rate, mono=True)
+                    y_next = audio_cache.load(other_path, sr)
                     # Resize to match
                     if len(y_next) < len(y_sum):
                         y_next = np.pad(y_next, (0, len(y_sum) - len(y_next)))
@@ -243,25 +382,9 @@ def main() -> int:
         all_intervals: List[np.ndarray] = []
         all_labels: List[str] = []
         all_root_logits: List[np.ndarray] = [] # Accumulate logits
-        chunk_index = 0
-        max_chunks = int(np.ceil(duration / args.chunk_dur)) + 2
-        timeline_time = 0.0  # accumulate actual processed duration instead of chunk_dur multiples
-
-        while chunk_index < max_chunks:
-            if timeline_time - duration > hop_seconds:
-                break
-            features = chunker.process_chunk(onset=timeline_time)
-            if features is None:
-                break
-
-            # Ensure shape [1, 1, F, T]
-            if features.ndim == 2:
-                features = features.unsqueeze(0).unsqueeze(0)
-            elif features.ndim == 3:
-                features = features.unsqueeze(0)
-
-            root_logits, bass_logits, chord_logits = predict_logits(model, features)
-
+        for timeline_time, root_logits, bass_logits, chord_logits in iter_chunk_logits(
+            model, chunker, duration, args.chunk_dur, hop_seconds, args.batch_chunks
+        ):
             # Accumulate raw logits (on CPU)
             if args.save_logits:
                 # root_logits is [T, 13]
@@ -289,9 +412,6 @@ def main() -> int:
                 all_intervals.append(intervals)
                 all_labels.extend(labels)
 
-            timeline_time += chunk_duration_real
-            chunk_index += 1
-
         logits_path_str = None
         if args.save_logits and all_root_logits:
             # Concatenate all chunks
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""Decode-once PCM cache shared by the preprocessing workers.
+
+Several workers decode the same source: the classifier resamples the track
+to 24 kHz, the beat worker wants 22050 Hz, and the ACE worker re-reads the
+bass / other stems at 22050 Hz on every run. `load()` decodes a file at
+most once per (content, sample rate, channel layout) and stores the result
+as a float32 `.npy` file that later callers memory-map instead of decoding
+again.
+
+Layout: `<cache_dir>/<blake2b of file bytes>_<sr>_<mono|multi>.npy`. Keys
+are content hashes, so renamed or duplicated files share one entry and an
+edited file never serves stale PCM. Entries are written to a temp file and
+renamed into place, so concurrent workers never read a partial array.
+
+Eviction is LRU by file mtime (refreshed on every hit): after each write
+the oldest entries are removed until the directory fits the size budget.
+Temp files left behind by a worker that died mid-write are removed by the
+same pass once they are older than STALE_TMP_SECONDS.
+
+Environment:
+    LUMA_AUDIO_CACHE_DIR        cache directory (default: `decoded_audio/`
+                                next to this module, i.e. the app cache dir)
+    LUMA_AUDIO_CACHE_MAX_BYTES  size budget (default 2 GiB)
+    LUMA_AUDIO_CACHE=0          bypass the cache and decode directly
+
+Shipped next to every worker script (see `python_env::ensure_worker_script`),
+so workers import it as a plain top-level module.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import pathlib
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+DEFAULT_MAX_BYTES = 2 * 1024**3
+# Far longer than any decode + write, so only orphaned temp files qualify.
+STALE_TMP_SECONDS = 3600.0
+_HASH_CHUNK = 1 << 20
+
+
+def env_dir(variable: str, default_name: str) -> pathlib.Path:
+    """Directory named by `variable`, else `default_name` next to the worker scripts."""
+    override = os.environ.get(variable)
+    if override:
+        return pathlib.Path(override)
+    return pathlib.Path(__file__).resolve().parent / default_name
+
+
+def env_bytes(variable: str, default: int) -> int:
+    """Byte budget from `variable`; unset or malformed values give `default`."""
+    try:
+        return int(os.environ.get(variable, default))
+    except ValueError:
+        return default
+
+
+def cache_dir() -> pathlib.Path:
+    return env_dir("LUMA_AUDIO_CACHE_DIR", "decoded_audio")
+
+
+def max_bytes() -> int:
+    return env_bytes("LUMA_AUDIO_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)
+
+
+def enabled() -> bool:
+    return os.environ.get("LUMA_AUDIO_CACHE", "1") != "0"
+
+
+def content_hash(path: pathlib.Path) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _decode(path: pathlib.Path, sr: int, mono: bool) -> np.ndarray:
+    import librosa
+
+    y, _ = librosa.load(str(path), sr=sr, mono=mono)
+    return np.ascontiguousarray(y, dtype=np.float32)
+
+
+def _evict(directory: pathlib.Path, budget: int, keep: pathlib.Path) -> None:
+    cutoff = time.time() - STALE_TMP_SECONDS
+    for tmp in directory.glob("*.tmp"):
+        try:
+            if tmp.stat().st_mtime < cutoff:
+                tmp.unlink()
+        except OSError:
+            pass
+
+    entries = []
+    for entry in directory.glob("*.npy"):
+        try:
+            st = entry.stat()
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, entry))
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries):
+        if total <= budget:
+            break
+        if entry == keep:
+            continue
+        try:
+            entry.unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as exc:
+            # Windows refuses to delete a file another worker still has
+            # memory-mapped; leave it for a later pass and keep evicting.
+            print(f"[audio_cache] could not evict {entry.name} ({exc})", file=sys.stderr, flush=True)
+            continue
+        total -= size
+
+
+def load(path: pathlib.Path | str, sr: int, mono: bool = True) -> np.ndarray:
+    """Decoded float32 PCM for `path` at `sr` (librosa layout: (n,) or (ch, n)).
+
+    Cached results are returned as read-only memory maps; copy before
+    mutating. Any cache failure falls back to a plain decode.
+    """
+    path = pathlib.Path(path)
+    if not enabled():
+        return _decode(path, sr, mono)
+
+    try:
+        directory = cache_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        entry = directory / f"{content_hash(path)}_{int(sr)}_{'mono' if mono else 'multi'}.npy"
+        if entry.exists():
+            try:
+                y = np.load(entry, mmap_mode="r")
+                os.utime(entry)
+                return y
+            except (OSError, ValueError) as exc:
+                print(f"[audio_cache] dropping unreadable {entry.name}: {exc}", file=sys.stderr, flush=True)
+                entry.unlink(missing_ok=True)
+
+        y = _decode(path, sr, mono)
+        fd, tmp_name = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                np.save(fh, y)
+            os.replace(tmp_name, entry)
+        except BaseException:
+            pathlib.Path(tmp_name).unlink(missing_ok=True)
+            raise
+        _evict(directory, max_bytes(), keep=entry)
+        return y
+    except OSError as exc:
+        print(f"[audio_cache] cache unavailable ({exc}); decoding directly", file=sys.stderr, flush=True)
+        return _decode(path, sr, mono)
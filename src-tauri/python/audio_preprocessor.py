@@ -1,20 +1,78 @@
 #!/usr/bin/env python3
+"""Demucs stem separation worker.
+
+    audio_preprocessor.py <audio_file> <target_dir> [--model htdemucs]
+
+Separates the track in-process with a `SeparationEngine` and pipes each
+stem into ffmpeg as OGG Opus; stdout carries one JSON payload
+`{"stems": [{"name", "path"}], "target_dir", "manifest", "timings"}`.
+`--shifts`, `--overlap` and `--segment` are passed straight to
+`demucs.apply.apply_model`.
+
+`--stream` bounds memory for long mixes: the track is decoded through an
+ffmpeg pipe and separated in overlapping `--chunk-seconds` chunks whose
+overlaps are crossfaded, and each finished block is written straight into
+the per-stem encoders.
+
+`--stems bass,other` writes only those stems and leaves the rest of
+`target_dir` alone; `manifest` maps every stem the model produces to its
+file there (or null), so callers can see what a partial run left behind.
+
+`timings` is a per-stage trailer (`StageTimings`): wall and CPU seconds,
+peak RSS, bytes read/written and the device, for cache lookup, model load,
+separation, encoding, publish and cache store.
+
+Work happens in a `Checkpoint` staging directory next to `target_dir`;
+finished stems are marked as they complete, so a rerun after an
+interruption only redoes the stems that were not finished. Resuming is per
+stem: a plain run that stops mid-separation separates the whole track
+again. `--stream` runs of tracks longer than `CHUNK_CHECKPOINT_SECONDS`
+also save each chunk as it is separated and resume from the last one.
+Finished stems are renamed into `target_dir`.
+
+Published stems are also kept in the content-addressed `stem_cache` store; a
+track whose audio, model and options were already separated is linked
+into `target_dir` without running Demucs (`LUMA_STEM_CACHE=0` disables).
+
+With `--manifest` the model stays resident and newline-delimited jobs
+`{"id", "audio_file", "target_dir", "stems"?}` are read from stdin,
+answered one line each with the same payload plus `id`.
+
+Progress is reported as NDJSON events (`ProgressEvents`) on stderr, or on
+the file descriptor given by `--progress-fd`: stage start/finish, Demucs
+segments done out of the expected total with an ETA, and per-stem encode
+start/finish.
+"""
 
 from __future__ import annotations
 
 import argparse
 import contextlib
+import functools
 import io
 import json
 import platform
 import shutil
 import sys
+import threading
+import time
 import warnings
 from pathlib import Path
 
 import soundfile
 import torch
-from demucs import separate as demucs_separate
+from demucs.apply import apply_model
+from demucs.audio import AudioFile, convert_audio, prevent_clip
+from demucs.pretrained import get_model
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# `--stream` saves per-chunk checkpoints only for tracks at least this long;
+# shorter ones are cheaper to separate again than to FLAC-encode every chunk.
+CHUNK_CHECKPOINT_SECONDS = 600.0
 
 
 def _detect_device() -> str:
@@ -31,32 +89,827 @@ def _detect_device() -> str:
     return "cpu"
 
 
-def compress_stems(source_dir: Path, target_dir: Path) -> None:
-    """Convert WAV stems to OGG Opus for smaller file size (~7x reduction)."""
+def _decode_pcm(audio_path: Path, sample_rate: int, channels: int, block_frames: int):
+    """Yield the track as float32 (channels, frames) tensors of `block_frames` each.
+
+    ffmpeg decodes and resamples into a pipe, so only one block is resident
+    at a time; the last block may be shorter.
+    """
     import subprocess
+    import tempfile
 
-    target_dir.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryFile() as errors:
+        proc = subprocess.Popen(
+            [
+                "ffmpeg",
+                "-v", "error",
+                "-nostdin",
+                "-i", str(audio_path),
+                "-f", "f32le",
+                "-ac", str(channels),
+                "-ar", str(sample_rate),
+                "pipe:1",
+            ],
+            stdout=subprocess.PIPE,
+            stderr=errors,
+        )
+        try:
+            block_bytes = block_frames * channels * 4
+            while True:
+                data = proc.stdout.read(block_bytes)
+                if not data:
+                    break
+                usable = len(data) - len(data) % (channels * 4)
+                block = torch.frombuffer(bytearray(data[:usable]), dtype=torch.float32)
+                yield block.view(-1, channels).t()
+        finally:
+            proc.stdout.close()
+            returncode = proc.wait()
+        if returncode != 0:
+            errors.seek(0)
+            detail = errors.read().decode(errors="replace").strip()
+            raise RuntimeError(f"ffmpeg could not decode {audio_path}: {detail}")
+
+
+def _load_track(audio_path: Path, channels: int, sample_rate: int) -> torch.Tensor:
+    """Decode the whole track as (channels, samples) the way `demucs.separate.load_track` does.
+
+    demucs' own helper calls sys.exit() on an unreadable file, which would
+    take a --manifest daemon down with it; this raises RuntimeError instead.
+    """
+    import subprocess
+
+    import torchaudio
+
+    errors = {}
+    try:
+        return AudioFile(audio_path).read(streams=0, samplerate=sample_rate, channels=channels)
+    except FileNotFoundError:
+        errors["ffmpeg"] = "FFmpeg is not installed."
+    except subprocess.CalledProcessError:
+        errors["ffmpeg"] = "FFmpeg could not read the file."
+    try:
+        wav, sr = torchaudio.load(str(audio_path))
+    except Exception as exc:
+        errors["torchaudio"] = str(exc)
+    else:
+        return convert_audio(wav, sr, sample_rate, channels)
+    detail = "; ".join(f"{backend}: {error}" for backend, error in errors.items())
+    raise RuntimeError(f"Could not load {audio_path} ({detail})")
+
+
+def _mixture_stats(
+    audio_path: Path, sample_rate: int, channels: int, block_frames: int
+) -> tuple[float, float, int]:
+    """Mean and (unbiased) std of the mono mixdown, as demucs normalises by, and its length in frames."""
+    count, total, total_sq = 0, 0.0, 0.0
+    for block in _decode_pcm(audio_path, sample_rate, channels, block_frames):
+        mono = block.mean(0).double()
+        count += mono.numel()
+        total += float(mono.sum())
+        total_sq += float((mono * mono).sum())
+    if count < 2:
+        raise RuntimeError(f"No audio decoded from {audio_path}")
+    mean = total / count
+    std = max((total_sq - count * mean * mean) / (count - 1), 0.0) ** 0.5
+    return mean, std, count
+
+
+def _resource_snapshot() -> dict:
+    snapshot = {"wall": time.perf_counter(), "cpu": time.process_time(), "children_cpu": None, "maxrss": None}
+    if resource is not None:
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        snapshot["children_cpu"] = children.ru_utime + children.ru_stime
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is bytes on macOS, KiB elsewhere.
+        snapshot["maxrss"] = maxrss if sys.platform == "darwin" else maxrss * 1024
+    snapshot["read"] = snapshot["written"] = None
+    try:
+        with open("/proc/self/io") as fh:
+            counters = dict(line.split(":", 1) for line in fh)
+        snapshot["read"] = int(counters["rchar"])
+        snapshot["written"] = int(counters["wchar"])
+    except (OSError, KeyError, ValueError):
+        pass
+    return snapshot
+
+
+def _resource_delta(before: dict, after: dict) -> dict:
+    def delta(key: str):
+        if before[key] is None or after[key] is None:
+            return None
+        return after[key] - before[key]
+
+    children_cpu = delta("children_cpu")
+    return {
+        "wall_s": round(after["wall"] - before["wall"], 4),
+        "cpu_s": round(after["cpu"] - before["cpu"], 4),
+        "children_cpu_s": round(children_cpu, 4) if children_cpu is not None else None,
+        "peak_rss_bytes": after["maxrss"],
+        "bytes_read": delta("read"),
+        "bytes_written": delta("written"),
+    }
+
+
+class ProgressEvents:
+    """Machine-readable progress, one JSON object per line.
+
+        {"event": "stage", "stage": "separate", "state": "started"}
+        {"event": "segment", "done": 12, "total": 40, "eta_s": 31.5}
+        {"event": "encode", "stem": "bass", "state": "finished", "codec": "opus", "seconds": 1.2}
+
+    Every event carries `elapsed_s` since the worker started, plus `fields`
+    (the job `id` in --manifest mode). `total` counts Demucs model
+    evaluations; with `--shifts` the random shift makes it an estimate, so
+    the last event may overshoot or undershoot it by a segment per shift.
+    The ETA extrapolates from segments actually computed (not ones replayed
+    from a checkpoint). Thread-safe; a None `stream` discards everything.
+    """
+
+    def __init__(self, stream=None) -> None:
+        self.stream = stream
+        self.fields: dict = {}
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self._segments_started = self._started
+        self._total = 0
+        self._done = 0
+        self._computed = 0
+
+    def emit(self, event: str, **fields) -> None:
+        if self.stream is None:
+            return
+        record = {"event": event, **self.fields, **fields}
+        record["elapsed_s"] = round(time.perf_counter() - self._started, 3)
+        with self._lock:
+            try:
+                self.stream.write(json.dumps(record) + "\n")
+                self.stream.flush()
+            except (OSError, ValueError):
+                # The reader went away; progress is best-effort.
+                self.stream = None
+
+    def start_segments(self, total: int) -> None:
+        with self._lock:
+            self._segments_started = time.perf_counter()
+            self._total = total
+            self._done = 0
+            self._computed = 0
+
+    def segments_done(self, count: int = 1, computed: bool = True) -> None:
+        with self._lock:
+            self._done += count
+            if computed:
+                self._computed += count
+            remaining = max(self._total - self._done, 0)
+            eta = None
+            if self._computed:
+                rate = (time.perf_counter() - self._segments_started) / self._computed
+                eta = round(rate * remaining, 1)
+            done, total = self._done, self._total
+        self.emit("segment", done=done, total=max(total, done), eta_s=eta)
+
+
+class StageTimings:
+    """Per-stage resource accounting, reported as the `timings` trailer.
+
+    Each stage records wall and CPU seconds (this process, and waited-for
+    children such as ffmpeg), the process peak RSS when it ended, and bytes
+    read/written by this process (files and pipes; Linux only).
+    """
+
+    def __init__(self, events: ProgressEvents | None = None) -> None:
+        self.device: str | None = None
+        self.stages: list[dict] = []
+        self.events = events
+        self._started = _resource_snapshot()
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        if self.events is not None:
+            self.events.emit("stage", stage=name, state="started")
+        before = _resource_snapshot()
+        try:
+            yield
+        finally:
+            record = _resource_delta(before, _resource_snapshot())
+            self.stages.append({"name": name, **record})
+            if self.events is not None:
+                self.events.emit("stage", stage=name, state="finished", wall_s=record["wall_s"])
+
+    def report(self) -> dict:
+        return {
+            "device": self.device,
+            "total": _resource_delta(self._started, _resource_snapshot()),
+            "stages": self.stages,
+        }
+
+
+class SeparationEngine:
+    """A Demucs model kept resident on its device across tracks.
+
+    `separate` mirrors `demucs.separate.main` (normalise by the mixture's
+    mean/std, apply, de-normalise) but reads the source path directly and
+    keeps the separated sources in memory instead of saving WAVs.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        device: str,
+        shifts: int = 1,
+        overlap: float = 0.25,
+        segment: float | None = None,
+        progress: bool = True,
+    ) -> None:
+        from demucs.apply import BagOfModels
+        from demucs.htdemucs import HTDemucs
+
+        model = get_model(model_name)
+        max_allowed_segment = float("inf")
+        if isinstance(model, HTDemucs):
+            max_allowed_segment = float(model.segment)
+        elif isinstance(model, BagOfModels):
+            max_allowed_segment = model.max_allowed_segment
+        trained = model.models[0] if isinstance(model, BagOfModels) else model
+        self.default_segment = min(float(getattr(trained, "segment", 10.0)), max_allowed_segment)
+        if segment is not None and segment > max_allowed_segment:
+            raise ValueError(
+                f"Segment {segment}s is longer than {model_name} was trained for "
+                f"(maximum {max_allowed_segment}s)"
+            )
+
+        # apply_model moves the model to `device` anyway; doing it once here
+        # keeps the weights there between tracks.
+        model.to(device)
+        model.eval()
+        self.model = model
+        self.model_name = model_name
+        self.device = device
+        self.shifts = shifts
+        self.overlap = overlap
+        self.segment = segment
+        self.progress = progress
+
+    def _leaf_models(self) -> list:
+        from demucs.apply import BagOfModels
+
+        return list(self.model.models) if isinstance(self.model, BagOfModels) else [self.model]
+
+    def segment_count(self, frames: int) -> int:
+        """Model evaluations `apply_model` makes for a `frames`-long input.
+
+        Exact without shifts; with them each pass covers the input plus a
+        random pad of up to half a second, counted here at its mean.
+        """
+        length = frames
+        if self.shifts:
+            length += int(0.5 * self.samplerate) // 2
+        total = 0
+        for model in self._leaf_models():
+            segment = self.segment if self.segment is not None else float(model.segment)
+            stride = int((1 - self.overlap) * int(model.samplerate * segment))
+            total += max(1, self.shifts) * -(-length // stride)
+        return total
+
+    @contextlib.contextmanager
+    def _report_segments(self, events: ProgressEvents | None):
+        # Each forward call of a (sub)model is one Demucs segment.
+        if events is None:
+            yield
+            return
+        handles = [model.register_forward_hook(lambda *_: events.segments_done()) for model in self._leaf_models()]
+        try:
+            yield
+        finally:
+            for handle in handles:
+                handle.remove()
+
+    @property
+    def sources(self) -> list[str]:
+        return list(self.model.sources)
+
+    @property
+    def samplerate(self) -> int:
+        return self.model.samplerate
+
+    @property
+    def audio_channels(self) -> int:
+        return self.model.audio_channels
+
+    def select(self, stems: list[str] | None) -> list[str]:
+        """Validate a stem subset against the model (None selects every source)."""
+        if stems is None:
+            return self.sources
+        unknown = [name for name in stems if name not in self.model.sources]
+        if unknown:
+            raise ValueError(
+                f"Unknown stem(s) {', '.join(unknown)}; {self.model_name} "
+                f"produces {', '.join(self.model.sources)}"
+            )
+        return [name for name in self.model.sources if name in stems]
+
+    def separate(
+        self, audio_path: Path, stems: list[str] | None = None, events: ProgressEvents | None = None
+    ) -> dict[str, torch.Tensor]:
+        """Return {stem name: [channels, samples]} on CPU for `audio_path`.
+
+        Demucs always estimates every source in one pass; `stems` only limits
+        which of them are de-normalised and handed back. Segment progress is
+        reported to `events`.
+        """
+        wanted = self.select(stems)
+        wav = _load_track(audio_path, self.model.audio_channels, self.model.samplerate)
+        ref = wav.mean(0)
+        wav -= ref.mean()
+        wav /= ref.std()
+        if events is not None:
+            events.start_segments(self.segment_count(wav.shape[-1]))
+        with torch.no_grad(), self._report_segments(events):
+            sources = apply_model(
+                self.model,
+                wav[None],
+                shifts=self.shifts,
+                split=True,
+                overlap=self.overlap,
+                progress=self.progress,
+                device=self.device,
+                segment=self.segment,
+            )[0]
+        separated = {}
+        for name, source in zip(self.model.sources, sources):
+            if name in wanted:
+                separated[name] = source.mul_(ref.std()).add_(ref.mean())
+        return separated
+
+    def iter_separated(
+        self,
+        audio_path: Path,
+        stems: list[str] | None = None,
+        chunk_seconds: float = 60.0,
+        overlap_seconds: float = 5.0,
+        checkpoint: Checkpoint | None = None,
+        events: ProgressEvents | None = None,
+    ):
+        """Separate `audio_path` chunk by chunk with bounded memory.
 
-    for wav_file in sorted(source_dir.glob("*.wav")):
-        target_file = target_dir / wav_file.with_suffix(".ogg").name
+        Yields {stem name: [channels, frames]} blocks that concatenate to the
+        full stems. Chunks of `chunk_seconds` overlap by `overlap_seconds`;
+        each overlap is linearly crossfaded between the two chunks that saw
+        it, so chunk edges (where Demucs lacks context) never reach the
+        output unblended. The mixture is decoded twice: once for the
+        normalisation statistics, once for separation.
+
+        With a `checkpoint`, chunks saved by an earlier run are replayed
+        instead of recomputed, and for tracks of `CHUNK_CHECKPOINT_SECONDS`
+        or more each chunk's raw output is saved as it is computed. Segment
+        progress across all chunks is reported to `events`.
+        """
+        wanted = self.select(stems)
+        indices = [self.model.sources.index(name) for name in wanted]
+        sample_rate = self.model.samplerate
+        channels = self.model.audio_channels
+        chunk = int(chunk_seconds * sample_rate)
+        overlap = int(overlap_seconds * sample_rate)
+        if overlap < 0 or chunk < 2 * overlap or chunk <= 0:
+            raise ValueError("chunk length must be positive and at least twice the overlap")
+        stride = chunk - overlap
+
+        stats = checkpoint.get("stats") if checkpoint is not None else None
+        if stats is None or len(stats) != 3:
+            stats = _mixture_stats(audio_path, sample_rate, channels, stride)
+            if checkpoint is not None:
+                checkpoint.set("stats", list(stats))
+        mean, std, frames = stats
+        save_chunks = checkpoint is not None and frames >= CHUNK_CHECKPOINT_SECONDS * sample_rate
+        if events is not None:
+            chunks = -(-frames // stride)
+            events.start_segments(
+                sum(self.segment_count(stride + (overlap if i else 0)) for i in range(chunks - 1))
+                + self.segment_count(frames - (chunks - 1) * stride + (overlap if chunks > 1 else 0))
+            )
+        fade_in = torch.linspace(0.0, 1.0, overlap + 2)[1:-1]
+
+        def emit(out: torch.Tensor) -> dict[str, torch.Tensor]:
+            return {name: out[i] for i, name in enumerate(wanted)}
+
+        context = None  # last `overlap` input frames of the previous chunk
+        tail = None  # previous chunk's output over those frames
+        pending = None  # output not yet emitted, held back until the next chunk arrives
+        position = 0
+        for index, block in enumerate(_decode_pcm(audio_path, sample_rate, channels, stride)):
+            mix = block if context is None else torch.cat([context, block], dim=1)
+            context = mix[:, -overlap:] if overlap else None
+            out = checkpoint.load_chunk(index, wanted) if checkpoint is not None else None
+            if out is not None and out.shape[-1] == mix.shape[-1]:
+                how = "restored"
+                if events is not None:
+                    events.segments_done(self.segment_count(mix.shape[-1]), computed=False)
+            else:
+                with torch.no_grad(), self._report_segments(events):
+                    out = apply_model(
+                        self.model,
+                        ((mix - mean) / std)[None],
+                        shifts=self.shifts,
+                        split=True,
+                        overlap=self.overlap,
+                        progress=False,
+                        device=self.device,
+                        segment=self.segment,
+                    )[0][indices]
+                out.mul_(std).add_(mean)
+                if save_chunks:
+                    checkpoint.save_chunk(index, wanted, out, sample_rate)
+                how = "separated"
+            print(
+                f"[audio_preprocessor] {how} {position / sample_rate:.0f}s-"
+                f"{(position + block.shape[1]) / sample_rate:.0f}s",
+                file=sys.stderr,
+                flush=True,
+            )
+            position += block.shape[1]
+
+            if pending is not None:
+                split_at = pending.shape[-1] - overlap
+                yield emit(pending[..., :split_at])
+                tail = pending[..., split_at:]
+            if tail is not None:
+                head = out[..., :overlap]
+                out = torch.cat([tail * (1.0 - fade_in) + head * fade_in, out[..., overlap:]], dim=-1)
+            pending = out
+        if pending is not None:
+            yield emit(pending)
+
+
+def _encode_stem(
+    name: str, source: torch.Tensor, sample_rate: int, target_dir: Path, events: ProgressEvents | None = None
+) -> tuple[str, float, bool]:
+    """Pipe one stem's float32 PCM into ffmpeg as OGG Opus, falling back to WAV."""
+    import subprocess
+    import time
+
+    started = time.perf_counter()
+    if events is not None:
+        events.emit("encode", stem=name, state="started")
+    # Same clipping guard demucs applies before writing its WAVs.
+    pcm = prevent_clip(source, mode="rescale").t().contiguous().numpy()  # (samples, channels)
+    target_file = target_dir / f"{name}.ogg"
+    try:
         result = subprocess.run(
-            ["ffmpeg", "-i", str(wav_file), "-c:a", "libopus", "-b:a", "96k", str(target_file), "-y"],
+            [
+                "ffmpeg",
+                "-f", "f32le",
+                "-ar", str(sample_rate),
+                "-ac", str(pcm.shape[1]),
+                "-i", "pipe:0",
+                "-c:a", "libopus",
+                "-b:a", "96k",
+                str(target_file),
+                "-y",
+            ],
+            input=memoryview(pcm).cast("B"),
             capture_output=True,
         )
-        if result.returncode != 0:
-            # Fallback: copy as WAV if ffmpeg/opus not available
-            data, sample_rate = soundfile.read(str(wav_file))
-            fallback = target_dir / wav_file.name
-            soundfile.write(str(fallback), data, sample_rate)
+        encoded = result.returncode == 0
+    except FileNotFoundError:
+        encoded = False
+    if not encoded:
+        # Fallback: write WAV if ffmpeg/opus not available
+        target_file.unlink(missing_ok=True)
+        soundfile.write(str(target_dir / f"{name}.wav"), pcm, sample_rate)
+    seconds = time.perf_counter() - started
+    if events is not None:
+        events.emit(
+            "encode", stem=name, state="finished", codec="opus" if encoded else "wav", seconds=round(seconds, 3)
+        )
+    return name, seconds, encoded
 
 
-def main() -> int:
+def encode_stems(
+    sources: dict[str, torch.Tensor],
+    sample_rate: int,
+    target_dir: Path,
+    max_workers: int | None = None,
+    on_done=None,
+    events: ProgressEvents | None = None,
+) -> None:
+    """Encode in-memory stems to OGG Opus for smaller file size (~7x reduction vs WAV).
+
+    Each stem streams over a pipe into its own ffmpeg process, so no
+    intermediate WAV is written; the encodes run concurrently (bounded by
+    core count) and threads only wait on the children.
+    """
+    import os
+    from concurrent.futures import ThreadPoolExecutor
+
+    target_dir.mkdir(parents=True, exist_ok=True)
+    if not sources:
+        return
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    workers = max(1, min(len(sources), max_workers))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        jobs = [
+            pool.submit(_encode_stem, name, source, sample_rate, target_dir, events)
+            for name, source in sources.items()
+        ]
+        for job in jobs:
+            stem, seconds, encoded = job.result()
+            how = "opus" if encoded else "wav fallback"
+            print(f"[audio_preprocessor] compressed {stem} ({how}) in {seconds:.2f}s", file=sys.stderr, flush=True)
+            if on_done is not None:
+                on_done(stem)
+
+
+def _existing_stem(target_dir: Path, name: str) -> Path | None:
+    # Fallback: a WAV is left behind if OGG conversion failed
+    for suffix in (".ogg", ".wav"):
+        path = target_dir / f"{name}{suffix}"
+        if path.exists():
+            return path
+    return None
+
+
+def _prepare_target(target_dir: Path, names: list[str], model_sources: list[str]) -> None:
+    # A full separation replaces the directory; a subset only its own stems.
+    if set(names) >= set(model_sources):
+        if target_dir.exists():
+            shutil.rmtree(target_dir)
+    else:
+        for name in names:
+            for suffix in (".ogg", ".wav"):
+                (target_dir / f"{name}{suffix}").unlink(missing_ok=True)
+    target_dir.mkdir(parents=True, exist_ok=True)
+
+
+def _list_stems(
+    target_dir: Path, names: list[str], model_sources: list[str]
+) -> tuple[list[dict], dict[str, str | None]]:
+    manifest = {}
+    for name in model_sources:
+        path = _existing_stem(target_dir, name)
+        manifest[name] = str(path) if path is not None else None
+    stems = [{"name": name, "path": manifest[name]} for name in sorted(names) if manifest[name]]
+    return stems, manifest
+
+
+class Checkpoint:
+    """Staging area that lets an interrupted separation resume.
+
+    Lives next to `target_dir` as `.<name>.partial/`. Stems are encoded
+    there and each gets a `<stem>.done` marker once its encoder finishes;
+    with `--stream` on tracks of `CHUNK_CHECKPOINT_SECONDS` or more, every
+    chunk's raw Demucs output is also kept under `chunks/` (16-bit FLAC, the
+    precision of the WAV fallback) so a rerun replays finished chunks
+    instead of recomputing them. Otherwise resuming is per stem only. `publish` renames
+    the finished stems into `target_dir` and removes the staging area.
+    `job.json` records the input and settings; a staging area left by a
+    different job is discarded.
+    """
+
+    @staticmethod
+    def staging_path(target_dir: Path) -> Path:
+        return target_dir.parent / f".{target_dir.name}.partial"
+
+    def __init__(self, target_dir: Path, identity: dict) -> None:
+        self.path = self.staging_path(target_dir)
+        self.chunks = self.path / "chunks"
+        try:
+            job = json.loads((self.path / "job.json").read_text())
+        except (OSError, ValueError):
+            job = None
+        if job is None or job.get("identity") != identity:
+            if self.path.exists():
+                shutil.rmtree(self.path)
+            job = {"identity": identity}
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._job = job
+        self._write_json("job.json", job)
+
+    def _write_json(self, name: str, payload: dict) -> None:
+        import os
+
+        tmp = self.path / f"{name}.tmp"
+        tmp.write_text(json.dumps(payload))
+        os.replace(tmp, self.path / name)
+
+    def get(self, key: str):
+        return self._job.get(key)
+
+    def set(self, key: str, value) -> None:
+        self._job[key] = value
+        self._write_json("job.json", self._job)
+
+    def reset_stems(self, names: list[str]) -> None:
+        """Drop partial output (and markers) of stems about to be re-encoded."""
+        for name in names:
+            for suffix in (".ogg", ".wav", ".done"):
+                (self.path / f"{name}{suffix}").unlink(missing_ok=True)
+
+    def done_stems(self) -> list[str]:
+        """Stems whose encode finished (marker present and file intact)."""
+        done = []
+        for marker in sorted(self.path.glob("*.done")):
+            try:
+                record = json.loads(marker.read_text())
+                intact = (self.path / record["file"]).stat().st_size == record["size"]
+            except (OSError, ValueError, KeyError):
+                intact = False
+            if intact:
+                done.append(marker.stem)
+        return done
+
+    def mark_done(self, name: str) -> None:
+        path = _existing_stem(self.path, name)
+        if path is None:
+            raise RuntimeError(f"Encoded stem {name} is missing from {self.path}")
+        self._write_json(f"{name}.done", {"file": path.name, "size": path.stat().st_size})
+
+    def load_chunk(self, index: int, names: list[str]) -> torch.Tensor | None:
+        """Saved [stems, channels, frames] output of chunk `index`, if complete."""
+        part = self.chunks / f"{index:05d}"
+        if not (part / "done").exists():
+            return None
+        try:
+            blocks = [soundfile.read(str(part / f"{name}.flac"), dtype="float32")[0] for name in names]
+        except (OSError, RuntimeError):
+            return None
+        return torch.stack([torch.from_numpy(block).t() for block in blocks])
+
+    def save_chunk(self, index: int, names: list[str], out: torch.Tensor, sample_rate: int) -> None:
+        part = self.chunks / f"{index:05d}"
+        part.mkdir(parents=True, exist_ok=True)
+        (part / "done").unlink(missing_ok=True)
+        for name, block in zip(names, out):
+            pcm = block.clamp(-1.0, 1.0).t().contiguous().numpy()
+            soundfile.write(str(part / f"{name}.flac"), pcm, sample_rate, subtype="PCM_16")
+        (part / "done").touch()
+
+    def publish(self, names: list[str], target_dir: Path, model_sources: list[str]) -> None:
+        """Move the finished `names` into `target_dir` and drop the staging area."""
+        import os
+
+        staged = {name: _existing_stem(self.path, name) for name in names}
+        missing = [name for name, path in staged.items() if path is None]
+        if missing:
+            raise RuntimeError(f"Stems {', '.join(missing)} were not produced")
+        _prepare_target(target_dir, names, model_sources)
+        for path in staged.values():
+            os.replace(path, target_dir / path.name)
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+@functools.lru_cache(maxsize=None)
+def _opus_available() -> bool:
+    import subprocess
+
+    try:
+        result = subprocess.run(["ffmpeg", "-hide_banner", "-encoders"], capture_output=True, text=True)
+    except FileNotFoundError:
+        return False
+    return result.returncode == 0 and "libopus" in result.stdout
+
+
+class _StemSink:
+    """Incremental writer for one stem: ffmpeg Opus over a pipe, or a WAV."""
+
+    def __init__(
+        self,
+        name: str,
+        target_dir: Path,
+        sample_rate: int,
+        channels: int,
+        opus: bool,
+        events: ProgressEvents | None = None,
+    ) -> None:
+        import subprocess
+        import tempfile
+
+        self.name = name
+        self.opus = opus
+        self.events = events
+        self._started = time.perf_counter()
+        self._proc = None
+        self._file = None
+        if opus:
+            self.path = target_dir / f"{name}.ogg"
+            self._errors = tempfile.TemporaryFile()
+            self._proc = subprocess.Popen(
+                [
+                    "ffmpeg",
+                    "-v", "error",
+                    "-f", "f32le",
+                    "-ar", str(sample_rate),
+                    "-ac", str(channels),
+                    "-i", "pipe:0",
+                    "-c:a", "libopus",
+                    "-b:a", "96k",
+                    str(self.path),
+                    "-y",
+                ],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=self._errors,
+            )
+        else:
+            # Fallback: write WAV if ffmpeg/opus not available
+            self.path = target_dir / f"{name}.wav"
+            self._file = soundfile.SoundFile(str(self.path), "w", sample_rate, channels)
+        if events is not None:
+            events.emit("encode", stem=name, state="started")
+
+    def _encoder_error(self) -> RuntimeError:
+        self._errors.seek(0)
+        detail = self._errors.read().decode(errors="replace").strip()
+        return RuntimeError(f"ffmpeg failed encoding {self.name}: {detail}")
+
+    def write(self, block: torch.Tensor) -> None:
+        # The stem's global peak is unknown while streaming, so clamp
+        # instead of demucs' whole-track rescale.
+        pcm = prevent_clip(block, mode="clamp").t().contiguous().numpy()  # (frames, channels)
+        if self._proc is not None:
+            try:
+                self._proc.stdin.write(memoryview(pcm).cast("B"))
+            except BrokenPipeError:
+                self._proc.wait()
+                raise self._encoder_error() from None
+        else:
+            self._file.write(pcm)
+
+    def close(self) -> None:
+        if self._proc is not None:
+            self._proc.stdin.close()
+            if self._proc.wait() != 0:
+                raise self._encoder_error()
+            self._errors.close()
+        else:
+            self._file.close()
+        if self.events is not None:
+            self.events.emit(
+                "encode",
+                stem=self.name,
+                state="finished",
+                codec="opus" if self.opus else "wav",
+                seconds=round(time.perf_counter() - self._started, 3),
+            )
+
+    def abort(self) -> None:
+        if self._proc is not None:
+            self._proc.kill()
+            self._proc.wait()
+            self._errors.close()
+        else:
+            self._file.close()
+        self.path.unlink(missing_ok=True)
+
+
+def stream_stems(
+    blocks,
+    names: list[str],
+    sample_rate: int,
+    channels: int,
+    out_dir: Path,
+    events: ProgressEvents | None = None,
+) -> None:
+    """Write `blocks` from `SeparationEngine.iter_separated` straight into per-stem encoders.
+
+    One ffmpeg process per stem consumes its pipe while the next chunk is
+    separated, so nothing track-length is ever held in memory.
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    opus = _opus_available()
+    if not opus:
+        print("[audio_preprocessor] ffmpeg libopus unavailable; writing WAV stems", file=sys.stderr, flush=True)
+    sinks = []
+    try:
+        for name in names:
+            sinks.append(_StemSink(name, out_dir, sample_rate, channels, opus, events))
+        for block in blocks:
+            for sink in sinks:
+                sink.write(block[sink.name])
+        for sink in sinks:
+            sink.close()
+    except BaseException:
+        for sink in sinks:
+            sink.abort()
+        raise
+
+
+def _stem_list(value: str) -> list[str]:
+    stems = list(dict.fromkeys(name.strip() for name in value.split(",") if name.strip()))
+    if not stems:
+        raise argparse.ArgumentTypeError("expected a comma-separated list of stem names")
+    return stems
+
+
+def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Run Demucs on a track and report the extracted stems.")
-    parser.add_argument("audio_file", type=Path, help="Path to the audio file to separate.")
+    parser.add_argument("audio_file", type=Path, nargs="?", help="Path to the audio file to separate.")
     parser.add_argument(
         "target_dir",
         type=Path,
-        help="Directory where the final stems should be stored (will contain stem WAV files).",
+        nargs="?",
+        help="Directory where the final stems should be stored (will contain stem OGG files).",
     )
     parser.add_argument(
         "--model",
@@ -68,58 +921,148 @@ def main() -> int:
         default=None,
         help="Device to run Demucs on (cpu/cuda/mps). If unset defaults to mps on macOS.",
     )
+    parser.add_argument(
+        "--shifts",
+        type=int,
+        default=1,
+        help="Random time shifts averaged per track (default: 1). Each one costs a full pass.",
+    )
+    parser.add_argument(
+        "--overlap",
+        type=float,
+        default=0.25,
+        help="Overlap between consecutive split segments as a fraction (default: 0.25).",
+    )
+    parser.add_argument(
+        "--segment",
+        type=float,
+        default=None,
+        help="Split segment length in seconds (default: the model's own; cannot exceed it for htdemucs).",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="Torch intra-op threads (default: autotuned, else this job's share of the cores).",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Separation jobs running side by side on this machine; each gets 1/jobs of the cores (default: 1).",
+    )
+    parser.add_argument(
+        "--autotune",
+        choices=("auto", "off", "force"),
+        default="off",
+        help="Benchmark the thread count once per machine and reuse the result (auto; the app "
+        "passes this), skip tuning (off, default), or re-benchmark now (force).",
+    )
+    parser.add_argument(
+        "--stems",
+        type=_stem_list,
+        default=None,
+        help="Comma-separated stems to write, e.g. bass,other (default: every stem the model produces).",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Separate in overlapping chunks and encode as they finish, so memory is bounded by "
+        "--chunk-seconds instead of track length (for long mixes).",
+    )
+    parser.add_argument(
+        "--chunk-seconds",
+        type=float,
+        default=60.0,
+        help="Chunk length for --stream (default: 60).",
+    )
+    parser.add_argument(
+        "--chunk-overlap",
+        type=float,
+        default=5.0,
+        help="Seconds shared and crossfaded between consecutive --stream chunks (default: 5).",
+    )
+    parser.add_argument(
+        "--progress-fd",
+        type=int,
+        default=2,
+        help="File descriptor for NDJSON progress events (default: 2, stderr; -1 disables).",
+    )
+    parser.add_argument(
+        "--manifest",
+        action="store_true",
+        help="Keep the model loaded and separate newline-delimited JSON jobs read from stdin.",
+    )
     args = parser.parse_args()
+    if not args.manifest and (args.audio_file is None or args.target_dir is None):
+        parser.error("audio_file and target_dir are required unless --manifest is given")
+    return args
 
-    warnings.filterwarnings("ignore")
 
-    audio_path = args.audio_file.resolve()
-    if not audio_path.exists():
-        print(f"Error: audio file does not exist: {audio_path}", file=sys.stderr)
-        return 1
+def separation_options(args: argparse.Namespace) -> dict:
+    """Everything besides the model that changes the separated audio."""
+    options = {"shifts": args.shifts, "overlap": args.overlap, "segment": args.segment}
+    if args.stream:
+        options["stream"] = {"chunk_seconds": args.chunk_seconds, "chunk_overlap": args.chunk_overlap}
+    return options
 
-    print(f"[audio_preprocessor] separating {audio_path}", file=sys.stderr, flush=True)
 
-    target_dir = args.target_dir.resolve()
-    target_dir.parent.mkdir(parents=True, exist_ok=True)
+def cache_key(audio_path: Path, args: argparse.Namespace) -> str | None:
+    """Stem store key for this track and these settings (None when the store is off)."""
+    import audio_cache
+    import stem_cache
 
-    working_dir = target_dir.parent.joinpath(f"demucs_work_{target_dir.name}")
-    if working_dir.exists():
-        shutil.rmtree(working_dir)
-    working_dir.mkdir(parents=True, exist_ok=True)
+    if not stem_cache.enabled():
+        return None
+    try:
+        audio_hash = audio_cache.content_hash(audio_path)
+    except OSError as exc:
+        print(f"[audio_preprocessor] cannot hash {audio_path} ({exc}); stem cache skipped", file=sys.stderr, flush=True)
+        return None
+    return stem_cache.entry_key(audio_hash, args.model, separation_options(args))
 
-    # Copy audio to a clean filename (track hash) to avoid demucs creating
-    # output directories with special characters or trailing whitespace from
-    # the original filename, which fails on Windows.
-    clean_stem = target_dir.name
-    clean_audio = working_dir / f"{clean_stem}{audio_path.suffix}"
-    shutil.copy2(audio_path, clean_audio)
 
-    demucs_opts = [
-        "--name",
-        args.model,
-        "--out",
-        str(working_dir),
-        str(clean_audio),
-    ]
-    device = args.device
-    if device is None:
-        device = _detect_device()
-    device_info = f" (device={device})" if device else ""
-    print(
-        f"[audio_preprocessor] running demucs {args.model}{device_info} -> {working_dir}",
-        file=sys.stderr,
-        flush=True,
-    )
-    
-    if device:
-        demucs_opts.extend(["--device", device])
+def restore_cached(
+    key: str | None, target_dir: Path, stems: list[str] | None
+) -> tuple[list[dict], dict[str, str | None]] | None:
+    """Materialise stored stems into `target_dir`; None means separate as usual."""
+    import stem_cache
+
+    if key is None:
+        return None
+    try:
+        hit = stem_cache.lookup(key, stems)
+        if hit is None:
+            return None
+        files, model_sources = hit
+        _prepare_target(target_dir, list(files), model_sources)
+        stem_cache.materialize(files, target_dir)
+    except OSError as exc:
+        print(f"[audio_preprocessor] stem cache unavailable ({exc}); separating", file=sys.stderr, flush=True)
+        return None
+    print(f"[audio_preprocessor] stem cache hit {key}", file=sys.stderr, flush=True)
+    return _list_stems(target_dir, list(files), model_sources)
+
+
+def cache_stems(key: str | None, stems: list[dict], model_sources: list[str]) -> None:
+    import stem_cache
+
+    if key is None:
+        return
+    try:
+        stem_cache.store(key, {stem["name"]: Path(stem["path"]) for stem in stems}, model_sources)
+    except OSError as exc:
+        print(f"[audio_preprocessor] could not store stems in cache ({exc})", file=sys.stderr, flush=True)
+
+
+@contextlib.contextmanager
+def _demucs_output_on_error():
+    """Swallow demucs' own console output unless the block fails."""
     demucs_buffer = io.StringIO()
     try:
-        with contextlib.redirect_stdout(demucs_buffer), contextlib.redirect_stderr(
-            demucs_buffer
-        ):
-            demucs_separate.main(demucs_opts)
-    except Exception:
+        with contextlib.redirect_stdout(demucs_buffer), contextlib.redirect_stderr(demucs_buffer):
+            yield
+    except BaseException:
         captured = demucs_buffer.getvalue().strip()
         if captured:
             print(
@@ -129,34 +1072,346 @@ def main() -> int:
             )
         raise
 
-    source_dir = working_dir / args.model / clean_stem
-    if not source_dir.exists():
-        print(f"Error: expected Demucs output not found at {source_dir}", file=sys.stderr)
+
+def job_identity(audio_path: Path, args: argparse.Namespace) -> dict:
+    """What a checkpoint must match to be resumed: same input file, model and options."""
+    st = audio_path.stat()
+    return {
+        "audio": str(audio_path),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "model": args.model,
+        "options": separation_options(args),
+    }
+
+
+def separate_track(
+    get_engine,
+    audio_path: Path,
+    target_dir: Path,
+    stems: list[str] | None,
+    args: argparse.Namespace,
+    timings: StageTimings,
+) -> tuple[list[dict], dict[str, str | None]]:
+    """Produce the requested stems in `target_dir`; return (written stems, manifest).
+
+    Served from the stem cache when possible. Otherwise work happens in a
+    `Checkpoint` staging area, so a run that was interrupted resumes with
+    the stems (and, with --stream on long tracks, the chunks) it already
+    finished.
+    `get_engine` is only called if Demucs actually has to run.
+    """
+    with timings.stage("cache_lookup"):
+        key = cache_key(audio_path, args)
+        cached = restore_cached(key, target_dir, stems)
+    if cached is not None:
+        shutil.rmtree(Checkpoint.staging_path(target_dir), ignore_errors=True)
+        return cached
+
+    checkpoint = Checkpoint(target_dir, job_identity(audio_path, args))
+    done = checkpoint.done_stems()
+    model_sources = checkpoint.get("sources")
+    wanted = None
+    if model_sources is not None:
+        wanted = model_sources if stems is None else [name for name in model_sources if name in stems]
+    if wanted is None or any(name not in done for name in wanted) or not wanted:
+        engine = get_engine()
+        model_sources = engine.sources
+        checkpoint.set("sources", model_sources)
+        wanted = engine.select(stems)
+        remaining = [name for name in wanted if name not in done]
+        if len(remaining) < len(wanted):
+            print(
+                f"[audio_preprocessor] resuming; already encoded: {', '.join(n for n in wanted if n in done)}",
+                file=sys.stderr,
+                flush=True,
+            )
+        if remaining:
+            checkpoint.reset_stems(remaining)
+            if args.stream:
+                # Separation and encoding interleave chunk by chunk; progress
+                # lines go straight to stderr.
+                with timings.stage("separate_encode"), contextlib.redirect_stdout(sys.stderr):
+                    blocks = engine.iter_separated(
+                        audio_path,
+                        remaining,
+                        args.chunk_seconds,
+                        args.chunk_overlap,
+                        checkpoint=checkpoint,
+                        events=timings.events,
+                    )
+                    stream_stems(
+                        blocks, remaining, engine.samplerate, engine.audio_channels, checkpoint.path, timings.events
+                    )
+                    for name in remaining:
+                        checkpoint.mark_done(name)
+            else:
+                with timings.stage("separate"), _demucs_output_on_error():
+                    sources = engine.separate(audio_path, remaining, events=timings.events)
+                # Compress stems (~7x smaller than WAV via OGG Opus)
+                print("[audio_preprocessor] compressing stems to OGG Opus", file=sys.stderr, flush=True)
+                with timings.stage("encode"):
+                    encode_stems(
+                        sources,
+                        engine.samplerate,
+                        checkpoint.path,
+                        on_done=checkpoint.mark_done,
+                        events=timings.events,
+                    )
+                    del sources
+    else:
+        print("[audio_preprocessor] resuming; every stem was already encoded", file=sys.stderr, flush=True)
+
+    with timings.stage("publish"):
+        checkpoint.publish(wanted, target_dir, model_sources)
+    written, manifest = _list_stems(target_dir, wanted, model_sources)
+    with timings.stage("cache_store"):
+        cache_stems(key, written, model_sources)
+    return written, manifest
+
+
+def _tuning_path() -> Path:
+    return Path(__file__).resolve().parent / "demucs_tuning.json"
+
+
+def _tuning_key(engine: SeparationEngine, cores: int) -> str:
+    return f"{engine.model_name}|{engine.device}|torch-{torch.__version__}|cores-{cores}"
+
+
+def _cores_per_job(jobs: int) -> int:
+    import os
+
+    return max(1, (os.cpu_count() or 1) // max(1, jobs))
+
+
+def _benchmark(engine: SeparationEngine, clip: torch.Tensor, threads: int) -> float | None:
+    """Seconds to separate `clip` with `threads` torch threads, or None if it fails."""
+    torch.set_num_threads(threads)
+    try:
+        with torch.no_grad():
+            started = time.perf_counter()
+            apply_model(
+                engine.model,
+                clip,
+                shifts=0,
+                split=True,
+                overlap=engine.overlap,
+                device=engine.device,
+                segment=engine.segment,
+            )
+            return time.perf_counter() - started
+    except RuntimeError as exc:
+        print(f"[audio_preprocessor] autotune: threads={threads} failed: {exc}", file=sys.stderr, flush=True)
+        return None
+
+
+def autotune(engine: SeparationEngine, cores: int, force: bool = False) -> dict:
+    """Best {"threads"} for a CPU job with `cores` cores to itself, benchmarked once and cached.
+
+    Results live in `demucs_tuning.json` next to this module, keyed by model,
+    device, torch version and `cores`. Candidates are all of them, half and
+    a quarter. The segment length is deliberately not tuned: HTDemucs pads
+    every segment to its training length, so a shorter one only adds
+    segments, and a tuned value would also have to join the stem cache key.
+    GPU runs are not tuned.
+    """
+    import os
+
+    if engine.device != "cpu":
+        return {}
+    path = _tuning_path()
+    key = _tuning_key(engine, cores)
+    try:
+        with open(path) as fh:
+            tuned = json.load(fh)
+    except (OSError, ValueError):
+        tuned = {}
+    if not force and key in tuned:
+        return tuned[key]
+
+    print(f"[audio_preprocessor] autotuning demucs for {key}", file=sys.stderr, flush=True)
+    thread_options = sorted({cores, max(1, cores // 2), max(1, cores // 4)}, reverse=True)
+    generator = torch.Generator().manual_seed(0)
+    clip = 0.1 * torch.randn(
+        1, engine.audio_channels, int((engine.default_segment + 1.0) * engine.samplerate), generator=generator
+    )
+    previous_threads = torch.get_num_threads()
+    try:
+        _benchmark(engine, clip, thread_options[0])  # warm-up
+        results = []
+        for threads in thread_options:
+            seconds = _benchmark(engine, clip, threads)
+            if seconds is not None:
+                results.append((seconds, threads))
+    finally:
+        torch.set_num_threads(previous_threads)
+    if not results:
+        raise RuntimeError(f"Every demucs configuration failed while autotuning {key}")
+
+    seconds, threads = min(results)
+    config = {"threads": threads, "seconds": round(seconds, 3)}
+    print(f"[audio_preprocessor] autotune picked {config}", file=sys.stderr, flush=True)
+    tuned[key] = config
+    try:
+        import tempfile
+
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w") as fh:
+            json.dump(tuned, fh, indent=2)
+        os.replace(tmp_name, path)
+    except OSError as exc:
+        print(f"[audio_preprocessor] could not save autotune results ({exc})", file=sys.stderr, flush=True)
+    return config
+
+
+def load_engine(args: argparse.Namespace, progress: bool = True) -> SeparationEngine:
+    device = args.device
+    if device is None:
+        device = _detect_device()
+    print(
+        f"[audio_preprocessor] loading demucs {args.model} (device={device})",
+        file=sys.stderr,
+        flush=True,
+    )
+    engine = SeparationEngine(
+        args.model,
+        device,
+        shifts=args.shifts,
+        overlap=args.overlap,
+        segment=args.segment,
+        progress=progress,
+    )
+    # An explicit --threads always wins; otherwise stay within this job's
+    # share of the cores so parallel jobs don't oversubscribe the CPU.
+    threads = args.threads
+    if threads is None and device == "cpu":
+        cores = _cores_per_job(args.jobs)
+        config = autotune(engine, cores, force=args.autotune == "force") if args.autotune != "off" else {}
+        threads = config.get("threads", cores if args.jobs > 1 else None)
+    if threads is not None:
+        torch.set_num_threads(threads)
+    return engine
+
+
+def progress_events(args: argparse.Namespace) -> ProgressEvents:
+    """Progress sink for `--progress-fd`, bound before any output redirection."""
+    import os
+
+    if args.progress_fd < 0:
+        return ProgressEvents(None)
+    if args.progress_fd == 2:
+        return ProgressEvents(sys.stderr)
+    try:
+        return ProgressEvents(os.fdopen(args.progress_fd, "w", buffering=1, closefd=False))
+    except OSError as exc:
+        print(f"[audio_preprocessor] progress fd {args.progress_fd} unusable ({exc})", file=sys.stderr, flush=True)
+        return ProgressEvents(None)
+
+
+def run_manifest(args: argparse.Namespace, events: ProgressEvents) -> int:
+    """Separate one track per newline-delimited JSON job read from stdin.
+
+        -> {"id": 1, "audio_file": "/path/track.mp3", "target_dir": "/path/stems", "stems": ["bass"]}
+        <- {"id": 1, "stems": [...], "target_dir": "/path/stems", "manifest": {...}}
+
+    The model is loaded once; a failed job answers with {"id", "error"}.
+    """
+    out = sys.stdout
+
+    def respond(payload: dict) -> None:
+        out.write(json.dumps(payload) + "\n")
+        out.flush()
+
+    # Stdout is the response channel; demucs output goes to stderr instead.
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            engine = load_engine(args, progress=False)
+        except Exception as exc:  # pragma: no cover - runtime error reporting
+            print(json.dumps({"error": f"Failed to load demucs {args.model}: {exc}"}), file=sys.stderr)
+            return 1
+
+        for line in sys.stdin:
+            if not line.strip():
+                continue
+            job_id = None
+            try:
+                job = json.loads(line)
+                job_id = job.get("id")
+                audio_path = Path(job["audio_file"]).resolve()
+                target_dir = Path(job["target_dir"]).resolve()
+                if not audio_path.exists():
+                    raise FileNotFoundError(f"Audio file does not exist: {audio_path}")
+                print(f"[audio_preprocessor] separating {audio_path}", file=sys.stderr, flush=True)
+                wanted = job.get("stems", args.stems)
+                target_dir.parent.mkdir(parents=True, exist_ok=True)
+                events.fields = {"id": job_id}
+                timings = StageTimings(events)
+
+                def get_engine() -> SeparationEngine:
+                    timings.device = engine.device
+                    return engine
+
+                stems, manifest = separate_track(get_engine, audio_path, target_dir, wanted, args, timings)
+                if not stems:
+                    raise RuntimeError("no stems were produced")
+                payload = {
+                    "stems": stems,
+                    "target_dir": str(target_dir),
+                    "manifest": manifest,
+                    "timings": timings.report(),
+                }
+            except Exception as exc:  # pragma: no cover - runtime error reporting
+                payload = {"error": str(exc)}
+            events.fields = {}
+            respond({"id": job_id, **payload})
+    return 0
+
+
+def main() -> int:
+    args = parse_args()
+    events = progress_events(args)
+    timings = StageTimings(events)
+
+    warnings.filterwarnings("ignore")
+
+    if args.manifest:
+        return run_manifest(args, events)
+
+    audio_path = args.audio_file.resolve()
+    if not audio_path.exists():
+        print(f"Error: audio file does not exist: {audio_path}", file=sys.stderr)
         return 1
 
-    # Compress stems (~7x smaller than WAV via OGG Opus)
-    print("[audio_preprocessor] compressing stems to OGG Opus", file=sys.stderr, flush=True)
-    if target_dir.exists():
-        shutil.rmtree(target_dir)
-    compress_stems(source_dir, target_dir)
+    print(f"[audio_preprocessor] separating {audio_path}", file=sys.stderr, flush=True)
 
-    # Clean up working directory
-    if working_dir.exists():
-        shutil.rmtree(working_dir)
+    target_dir = args.target_dir.resolve()
+    target_dir.parent.mkdir(parents=True, exist_ok=True)
 
-    stems = []
-    for stem_file in sorted(target_dir.glob("*.ogg")):
-        stems.append({"name": stem_file.stem, "path": str(stem_file)})
-    # Fallback: check for WAV if OGG conversion failed
-    if not stems:
-        for stem_file in sorted(target_dir.glob("*.wav")):
-            stems.append({"name": stem_file.stem, "path": str(stem_file)})
+    def get_engine() -> SeparationEngine:
+        with timings.stage("model_load"), contextlib.redirect_stdout(sys.stderr):
+            engine = load_engine(args)
+        timings.device = engine.device
+        return engine
+
+    try:
+        stems, manifest = separate_track(get_engine, audio_path, target_dir, args.stems, args, timings)
+    except (RuntimeError, ValueError) as exc:
+        # Undecodable audio or a --stems name the model doesn't produce.
+        print(json.dumps({"error": str(exc)}), file=sys.stderr)
+        return 1
 
     if not stems:
         print("Error: no stems were produced", file=sys.stderr, flush=True)
         return 1
 
-    print(json.dumps({"stems": stems, "target_dir": str(target_dir)}))
+    report = timings.report()
+    for stage in report["stages"]:
+        print(
+            f"[audio_preprocessor] {stage['name']}: {stage['wall_s']:.2f}s wall, {stage['cpu_s']:.2f}s cpu",
+            file=sys.stderr,
+            flush=True,
+        )
+    print(json.dumps({"stems": stems, "target_dir": str(target_dir), "manifest": manifest, "timings": report}))
     return 0
 
 
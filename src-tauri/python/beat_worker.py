@@ -3,21 +3,61 @@
 Fixed-BPM beat grid extractor.
 Given an audio file path, it emits a JSON payload containing beat/downbeat
 timestamps plus the fixed BPM metadata (bpm, downbeat offset, beats_per_bar).
+
+`--variable-tempo` fits piecewise-constant tempo regions instead (for live
+drummers and DJ mixes) and adds `tempo_segments`, a list of
+`{"start", "end", "bpm", "offset"}`. A region starts on the first beat of
+its tempo. `beats`/`downbeats` follow each region's grid, and
+`bpm`/`downbeat_offset` describe the longest region.
+
+With `--serve` the worker stays resident instead: the beat_this model is
+loaded once and newline-delimited JSON requests are answered from stdin,
+one response line per request on stdout:
+
+    -> {"id": 1, "audio_file": "/path/track.mp3", "bpm_min": 70, "bpm_max": 170}
+    <- {"id": 1, "beats": [...], "downbeats": [...], "bpm": ..., ...}
+    <- {"id": 2, "error": "..."}
+
+`id`, `bpm_min`, `bpm_max`, `variable_tempo`, `beats_per_bar` and
+`save_logits` are optional (they default to the CLI flags). A request may
+name a `logits_path` instead of an `audio_file` to re-solve a saved grid. A
+`{"ready": true}` line is written once the model has loaded.
+
+`--save-logits` keeps the network's raw beat/downbeat logits in the app
+cache dir as `beat_logits/<content hash>_<checkpoint>.beat_logits.bin`
+(float16 pairs, one per 441-sample frame at 22050 Hz; `LUMA_BEAT_LOGITS_DIR`
+overrides the directory) and reports it as `logits_path`; a failed write
+only logs a warning. `--from-logits PATH`
+re-solves the grid from such a file without loading the model, so changing
+the BPM range or bar lengths takes milliseconds instead of an inference
+pass.
 """
 
 from __future__ import annotations
 
 import argparse
+import contextlib
 import json
 import math
+import os
 import pathlib
 import sys
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Iterable
 
 import numpy as np
 
 
+def _int_list(value: str) -> list[int]:
+    try:
+        values = [int(item) for item in value.split(",") if item.strip()]
+    except ValueError:
+        values = []
+    if not values or min(values) < 1:
+        raise argparse.ArgumentTypeError("expected a comma-separated list of positive integers")
+    return values
+
+
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(
         description="Compute beat and downbeat timings for an audio file.",
@@ -25,8 +65,14 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         "audio_file",
         type=pathlib.Path,
+        nargs="?",
         help="Path to the audio file that should be analysed.",
     )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Keep the model loaded and answer newline-delimited JSON requests on stdin.",
+    )
     parser.add_argument(
         "--checkpoint",
         default="final0",
@@ -44,7 +90,32 @@ def parse_args() -> argparse.Namespace:
         default=170.0,
         help="Upper BPM bound for the fixed-grid search.",
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--variable-tempo",
+        action="store_true",
+        help="Fit piecewise-constant tempo segments instead of one BPM for the whole track.",
+    )
+    parser.add_argument(
+        "--beats-per-bar",
+        type=_int_list,
+        default=[4],
+        help="Comma-separated bar lengths to try when placing downbeats (default: 4).",
+    )
+    parser.add_argument(
+        "--save-logits",
+        action="store_true",
+        help="Save the raw beat/downbeat logits as a float16 sidecar in the app cache dir.",
+    )
+    parser.add_argument(
+        "--from-logits",
+        type=pathlib.Path,
+        default=None,
+        help="Re-solve the grid from a saved logits sidecar instead of running the model.",
+    )
+    args = parser.parse_args()
+    if args.audio_file is None and not (args.serve or args.from_logits):
+        parser.error("audio_file is required unless --serve or --from-logits is given")
+    return args
 
 
 def serialize(values):
@@ -63,20 +134,72 @@ def _interpolate_at(times, values, query):
     return np.interp(query, times, values, left=0.0, right=0.0)
 
 
-def _score_grid(beat_probs, times, duration, bpm, phases):
-    period = 60.0 / bpm
-    best_phase, best_score = 0.0, -np.inf
-    for phase in phases:
-        grid_times = np.arange(phase, duration, period)
-        if len(grid_times) == 0:
-            continue
-        vals = _interpolate_at(times, beat_probs, grid_times)
-        score = float(vals.mean())
-        if score > best_score:
-            best_score, best_phase = score, float(phase)
+def _arange_grids(starts, steps, length):
+    """Row-wise `np.arange(start, stop, step)` for grids sharing one length.
+
+    Reproduces numpy's fill arithmetic (`start + i * ((start + step) - start)`
+    with the second element stored as `start + step`) so every sample is
+    bit-identical to the scalar call.
+    """
+    deltas = (starts + steps) - starts
+    grid = starts[:, None] + np.arange(length, dtype=np.float64)[None, :] * deltas[:, None]
+    grid[:, 0] = starts
+    if length > 1:
+        grid[:, 1] = starts + steps
+    return grid
+
+
+def _score_grid(beat_probs, times, duration, bpms, phases):
+    """Best phase per BPM: mean beat probability sampled on each candidate grid.
+
+    `bpms` is (B,) and `phases` is (B, P). All B*P candidates are scored in
+    batched passes, one per distinct beat count, so each row mean reduces
+    exactly like the per-candidate 1-D mean. Empty grids score -inf, and ties
+    resolve to the earliest phase.
+    """
+    periods = np.broadcast_to((60.0 / bpms)[:, None], phases.shape).ravel()
+    starts = phases.ravel()
+    # Same length computation as np.arange(phase, duration, period).
+    lengths = np.ceil((duration - starts) / periods)
+    scores = np.full(starts.shape, -np.inf)
+    for length in np.unique(lengths[lengths > 0]):
+        idx = np.flatnonzero(lengths == length)
+        grid = _arange_grids(starts[idx], periods[idx], int(length))
+        scores[idx] = _interpolate_at(times, beat_probs, grid).mean(axis=1)
+
+    scores = scores.reshape(phases.shape)
+    best_idx = scores.argmax(axis=1)
+    rows = np.arange(len(bpms))
+    best_score = scores[rows, best_idx]
+    best_phase = np.where(np.isfinite(best_score), phases[rows, best_idx], 0.0)
     return best_phase, best_score
 
 
+def _fold_phase(beat_probs, times, periods, batch=16):
+    """Best grid phase per period, from beat_probs folded modulo each period.
+
+    Each frame is an angle `2 pi t / period` on the circle, weighted by its
+    squared beat probability (which keeps weak off-beat activity from
+    pulling the mean); the phase is the angle of the weighted circular
+    mean, so it has sub-frame resolution and costs one O(N) pass per
+    period instead of a grid evaluation per phase candidate.
+
+    The angle comes back in (-period/2, period/2]. A first beat that lands
+    just before 0 (within one frame) snaps to 0 instead of wrapping to
+    period - epsilon, which would drop it from the grid.
+    """
+    weights = beat_probs * beat_probs
+    snap = times[1] - times[0] if len(times) > 1 else 0.0
+    phases = np.empty(len(periods))
+    for first in range(0, len(periods), batch):
+        chunk = periods[first : first + batch]
+        angles = (2.0 * np.pi / chunk)[:, None] * times[None, :]
+        resultant = np.cos(angles) @ weights + 1j * (np.sin(angles) @ weights)
+        phase = np.angle(resultant) * chunk / (2.0 * np.pi)
+        phases[first : first + batch] = np.where(phase < -snap, phase + chunk, np.maximum(phase, 0.0))
+    return phases
+
+
 def _pick_downbeats(downbeat_probs, times, duration, period, base_phase, beats_per_bar_candidates=(4,)):
     best_bpb, best_phase, best_score = 4, base_phase, -np.inf
     for bpb in beats_per_bar_candidates:
@@ -94,6 +217,55 @@ def _pick_downbeats(downbeat_probs, times, duration, period, base_phase, beats_p
     return downbeats, best_bpb
 
 
+TEMPO_TOP_K = 3
+TEMPO_MIN_CONFIDENCE = 0.1
+
+
+def _tempo_candidates(beat_probs, hop_seconds, bpm_grid, top_k=TEMPO_TOP_K, min_confidence=TEMPO_MIN_CONFIDENCE):
+    """Prune `bpm_grid` to the tempi the beat activation actually repeats at.
+
+    A comb over the normalised autocorrelation of `beat_probs` (lags of 1-3
+    beat periods) scores every BPM; the `top_k` peaks, their neighbours and
+    their octave relatives (half and double tempo) survive, in grid order.
+    Returns (candidate BPMs, confidence), where confidence is the best
+    comb score; below `min_confidence` the whole grid is returned.
+    """
+    n = len(beat_probs)
+    if n < 2:
+        return bpm_grid, 0.0
+    centred = beat_probs - beat_probs.mean()
+    spectrum = np.fft.rfft(centred, 2 * n)
+    ac = np.fft.irfft(spectrum * np.conj(spectrum))[:n]
+    if ac[0] <= 0:
+        return bpm_grid, 0.0
+    ac /= ac[0]
+    lags = 60.0 / (bpm_grid * hop_seconds)
+    comb = np.mean([np.interp(k * lags, np.arange(n), ac, right=0.0) for k in (1, 2, 3)], axis=0)
+
+    peaks = [
+        i
+        for i in range(len(comb))
+        if (i == 0 or comb[i] >= comb[i - 1]) and (i == len(comb) - 1 or comb[i] > comb[i + 1])
+    ]
+    peaks = sorted(peaks, key=lambda i: comb[i], reverse=True)[:top_k]
+    confidence = float(comb[peaks[0]]) if peaks else 0.0
+    if confidence < min_confidence:
+        return bpm_grid, confidence
+    keep = np.zeros(len(bpm_grid), dtype=bool)
+    for i in peaks:
+        for bpm in (bpm_grid[i], bpm_grid[i] * 2.0, bpm_grid[i] / 2.0):
+            keep |= np.abs(bpm_grid - bpm) <= 1.5
+    return bpm_grid[keep], confidence
+
+
+@dataclass
+class TempoSegment:
+    start: float
+    end: float
+    bpm: float
+    offset: float  # first beat of the segment
+
+
 @dataclass
 class GridResult:
     bpm: float
@@ -101,6 +273,8 @@ class GridResult:
     beats_per_bar: int
     beats: list[float]
     downbeats: list[float]
+    tempo_segments: list[TempoSegment] = field(default_factory=list)
+    bpm_candidates: int = 0
 
 
 def fixed_bpm_from_logits(
@@ -109,52 +283,473 @@ def fixed_bpm_from_logits(
     hop_seconds,
     bpm_min=70.0,
     bpm_max=170.0,
+    beats_per_bar_candidates=(4,),
 ):
     times = np.arange(len(beat_logits)) * hop_seconds
     duration = times[-1] if len(times) else 0.0
     beat_probs = _sigmoid_array(beat_logits)
     downbeat_probs = _sigmoid_array(downbeat_logits)
 
-    # coarse sweep
+    # coarse sweep, over the tempogram's candidates when it is confident
     bpm_grid = np.arange(bpm_min, bpm_max + 1e-6, 1.0)
-    best = None
-    for bpm in bpm_grid:
-        period = 60.0 / bpm
-        phases = np.linspace(0, period, num=24, endpoint=False)
-        phase, score = _score_grid(beat_probs, times, duration, bpm, phases)
-        beats = np.arange(phase, duration, period)
-        downbeats, bpb = _pick_downbeats(downbeat_probs, times, duration, period, phase)
-        if best is None or score > best[0]:
-            best = (score, bpm, phase, bpb, beats, downbeats)
+    bpm_grid, _ = _tempo_candidates(beat_probs, hop_seconds, bpm_grid)
+    phases = _fold_phase(beat_probs, times, 60.0 / bpm_grid)[:, None]
+    coarse_phase, coarse_score = _score_grid(beat_probs, times, duration, bpm_grid, phases)
+    i = int(coarse_score.argmax())
+    bpm_best, phase_best, score_best = bpm_grid[i], coarse_phase[i], coarse_score[i]
 
     # refine around the best BPM
-    _, bpm_best, phase_best, bpb_best, beats_best, down_best = best
     fine_grid = np.arange(max(bpm_min, bpm_best - 4), min(bpm_max, bpm_best + 4), 0.1)
-    for bpm in fine_grid:
-        period = 60.0 / bpm
-        phases = np.linspace(phase_best - 0.25 * period, phase_best + 0.25 * period, num=48, endpoint=False)
-        phase, score = _score_grid(beat_probs, times, duration, bpm, phases)
-        beats = np.arange(phase, duration, period)
-        downbeats, bpb = _pick_downbeats(downbeat_probs, times, duration, period, phase)
-        if score > best[0]:
-            best = (score, bpm, phase, bpb, beats, downbeats)
-
-    score, bpm, phase, bpb, beats, downbeats = best
+    if len(fine_grid):
+        phases = _fold_phase(beat_probs, times, 60.0 / fine_grid)[:, None]
+        fine_phase, fine_score = _score_grid(beat_probs, times, duration, fine_grid, phases)
+        j = int(fine_score.argmax())
+        if fine_score[j] > score_best:
+            bpm_best, phase_best, score_best = fine_grid[j], fine_phase[j], fine_score[j]
+
+    # Downbeats only need resolving for the winning grid.
+    bpm, phase = bpm_best, float(phase_best)
+    period = 60.0 / bpm
+    beats = np.arange(phase, duration, period)
+    downbeats, bpb = _pick_downbeats(downbeat_probs, times, duration, period, phase, beats_per_bar_candidates)
     return GridResult(
         bpm=float(bpm),
         offset=float(phase),
         beats_per_bar=int(bpb),
         beats=serialize(beats),
         downbeats=serialize(downbeats),
+        bpm_candidates=len(bpm_grid),
     )
 
 
+TEMPO_WINDOW_SECONDS = 8.0
+TEMPO_CHANGE_PENALTY = 1.0
+
+
+def _window_scores(beat_probs, times, duration, bpms, phases, window):
+    """(W, B) best mean beat probability per `window`-second window and BPM.
+
+    Each candidate grid is laid over the whole track once (as in
+    `_score_grid`) and its samples are summed per window, so the best phase
+    can differ between windows without re-sweeping each one.
+    """
+    n_windows = max(1, int(np.ceil(duration / window)))
+    periods = np.broadcast_to((60.0 / bpms)[:, None], phases.shape).ravel()
+    starts = phases.ravel()
+    lengths = np.ceil((duration - starts) / periods)
+    means = np.zeros((starts.size, n_windows))
+    for length in np.unique(lengths[lengths > 0]):
+        idx = np.flatnonzero(lengths == length)
+        grid = _arange_grids(starts[idx], periods[idx], int(length))
+        vals = _interpolate_at(times, beat_probs, grid)
+        win = np.minimum((grid // window).astype(np.int64), n_windows - 1)
+        flat = (np.arange(len(idx))[:, None] * n_windows + win).ravel()
+        size = len(idx) * n_windows
+        sums = np.bincount(flat, weights=vals.ravel(), minlength=size)
+        counts = np.bincount(flat, minlength=size)
+        means[idx] = (sums / np.maximum(counts, 1)).reshape(len(idx), n_windows)
+    return means.reshape(phases.shape + (n_windows,)).max(axis=1).T
+
+
+def _segment_states(scores, change_penalty):
+    """Viterbi path through (W, B) window scores, paying `change_penalty` per tempo change.
+
+    With a flat switching cost the best predecessor of every state is
+    either itself or the overall best, so each step is O(B).
+    """
+    n_windows, n_states = scores.shape
+    states = np.arange(n_states)
+    total = scores[0].copy()
+    back = np.zeros((n_windows, n_states), dtype=np.int64)
+    for w in range(1, n_windows):
+        best = int(total.argmax())
+        switch = total[best] - change_penalty
+        back[w] = np.where(total >= switch, states, best)
+        total = np.maximum(total, switch) + scores[w]
+    path = np.empty(n_windows, dtype=np.int64)
+    path[-1] = int(total.argmax())
+    for w in range(n_windows - 1, 0, -1):
+        path[w - 1] = back[w, path[w]]
+    return path
+
+
+def _refine_change(beat_probs, times, left, cut, right, bpm_before, bpm_after, reach):
+    """Frame in (left, right) where the tempo switches, to the nearest beat of the new tempo.
+
+    `cut` is the window-level change point between the regions
+    [left, cut) and [cut, right). Each tempo's grid is phased on its own
+    region, then every beat of the new grid within `reach` frames of `cut`
+    is tried as the first beat after the change; the split that puts the
+    most beat evidence (probability above 0.5) on the grid in force wins.
+    """
+    lo, hi = max(left + 1, cut - reach), min(right, cut + reach)
+    grids = []
+    for bpm, first, last in ((bpm_before, left, cut), (bpm_after, cut, right)):
+        period = 60.0 / bpm
+        phase = _fold_phase(beat_probs[first:last], times[first:last], np.array([period]))[0]
+        grid = np.arange(phase, times[hi - 1], period)
+        grid = grid[grid >= times[lo]]
+        grids.append((grid, _interpolate_at(times, beat_probs, grid) - 0.5))
+    (grid_before, gain_before), (grid_after, gain_after) = grids
+    if not len(grid_after):
+        return cut
+    # Split before the k-th beat of the new grid: old-grid beats earlier than
+    # it plus new-grid beats from it on.
+    before = np.concatenate([[0.0], np.cumsum(gain_before)])[np.searchsorted(grid_before, grid_after)]
+    after = np.cumsum(gain_after[::-1])[::-1]
+    best = int(np.argmax(before + after))
+    return int(np.clip(round(grid_after[best] / (times[1] - times[0])), lo, hi - 1))
+
+
+def variable_bpm_from_logits(
+    beat_logits,
+    downbeat_logits,
+    hop_seconds,
+    bpm_min=70.0,
+    bpm_max=170.0,
+    beats_per_bar_candidates=(4,),
+    window_seconds=TEMPO_WINDOW_SECONDS,
+    change_penalty=TEMPO_CHANGE_PENALTY,
+):
+    """Piecewise-constant tempo grid: change points by DP, each region fitted like a fixed grid.
+
+    Every `window_seconds` window is scored against the coarse BPM grid in
+    one batched pass; a Viterbi pass then picks one BPM per window, paying
+    `change_penalty` (in summed mean beat probability) for each change.
+    Each change point is then moved from the window grid to the first beat
+    of the new tempo (`_refine_change`). Each run of equal BPM is refined
+    with `fixed_bpm_from_logits` limited to that region, and the regional
+    grids are concatenated, dropping a beat that lands within half a period
+    of the previous region's last.
+    """
+    beat_logits = np.asarray(beat_logits)
+    downbeat_logits = np.asarray(downbeat_logits)
+    times = np.arange(len(beat_logits)) * hop_seconds
+    duration = times[-1] if len(times) else 0.0
+    if duration <= window_seconds:
+        result = fixed_bpm_from_logits(
+            beat_logits, downbeat_logits, hop_seconds, bpm_min, bpm_max, beats_per_bar_candidates
+        )
+        start = result.beats[0] if result.beats else result.offset
+        result.tempo_segments = [TempoSegment(0.0, float(duration), result.bpm, float(start))]
+        return result
+
+    beat_probs = _sigmoid_array(beat_logits)
+    bpm_grid = np.arange(bpm_min, bpm_max + 1e-6, 1.0)
+    phases = np.linspace(0, 60.0 / bpm_grid, num=24, endpoint=False, axis=1)
+    scores = _window_scores(beat_probs, times, duration, bpm_grid, phases, window_seconds)
+    path = _segment_states(scores, change_penalty)
+
+    changes = [w for w in range(1, len(path)) if path[w] != path[w - 1]]
+    window_frames = int(round(window_seconds / hop_seconds))
+    cuts = [0] + [w * window_frames for w in changes] + [len(beat_logits)]
+    for i, w in enumerate(changes, start=1):
+        cuts[i] = _refine_change(
+            beat_probs,
+            times,
+            cuts[i - 1],
+            cuts[i],
+            cuts[i + 1],
+            bpm_grid[path[w - 1]],
+            bpm_grid[path[w]],
+            reach=window_frames,
+        )
+    states = [path[0]] + [path[w] for w in changes]
+
+    beats, downbeats, segments = [], [], []
+    longest = None
+    for lo, hi, state in zip(cuts[:-1], cuts[1:], states):
+        last_region = hi == len(beat_logits)
+        bpm = bpm_grid[state]
+        region = fixed_bpm_from_logits(
+            beat_logits[lo:hi],
+            downbeat_logits[lo:hi],
+            hop_seconds,
+            bpm_min=max(bpm_min, bpm - 2.0),
+            bpm_max=min(bpm_max, bpm + 2.0),
+            beats_per_bar_candidates=beats_per_bar_candidates,
+        )
+        start = lo * hop_seconds
+        end = times[hi - 1] if last_region else hi * hop_seconds
+        half_period = 30.0 / region.bpm
+        region_beats = [start + t for t in region.beats if not beats or start + t > beats[-1] + half_period]
+        region_downbeats = [
+            start + t for t in region.downbeats if not downbeats or start + t > downbeats[-1] + half_period
+        ]
+        beats.extend(region_beats)
+        downbeats.extend(region_downbeats)
+        segment = TempoSegment(
+            start=float(start),
+            end=float(end),
+            bpm=region.bpm,
+            offset=float(region_beats[0]) if region_beats else float(start + region.offset),
+        )
+        segments.append(segment)
+        if longest is None or end - start > longest[0]:
+            longest = (end - start, region)
+
+    dominant = longest[1]
+    return GridResult(
+        bpm=dominant.bpm,
+        offset=float(beats[0]) if beats else 0.0,
+        beats_per_bar=dominant.beats_per_bar,
+        beats=serialize(beats),
+        downbeats=serialize(downbeats),
+        tempo_segments=segments,
+        bpm_candidates=len(bpm_grid),
+    )
+
+
+BEAT_THIS_SR = 22050
+HOP_SAMPLES = 441
+HOP_SECONDS = HOP_SAMPLES / BEAT_THIS_SR  # matches beat_this preprocessing
+N_FFT = 1024
+CHUNK_FRAMES = 1500  # beat_this' training excerpt length, as Spect2Frames uses
+BORDER_FRAMES = 6
+
+
+def load_tracker(checkpoint: str):
+    from beat_this.inference import Audio2Frames
+
+    return Audio2Frames(checkpoint_path=str(checkpoint), device="cpu", float16=False)
+
+
+def chunk_starts(n_frames: int, chunk: int = CHUNK_FRAMES, border: int = BORDER_FRAMES) -> np.ndarray:
+    """Model window starts exactly as `beat_this.inference.split_piece` lays them out."""
+    starts = np.arange(-border, n_frames - border, chunk - 2 * border)
+    if n_frames > chunk - 2 * border:
+        starts[-1] = n_frames - (chunk - border)
+    return starts
+
+
+def _spect_frames(tracker, signal, first: int, last: int):
+    """Log-mel frames [first, last) of `signal`, computed from just the samples they need.
+
+    The STFT is centred with reflect padding; a slice that starts or ends
+    at a frame boundary two hops away from the wanted frames sees the same
+    samples as the full-signal transform, and slices touching the ends of
+    the signal get the same reflect padding. So the frames are identical to
+    slicing the whole spectrogram.
+    """
+    import torch
+
+    lo = max(0, (first - 2) * HOP_SAMPLES)
+    hi = min(len(signal), (last + 2) * HOP_SAMPLES + N_FFT)
+    piece = torch.tensor(np.asarray(signal[lo:hi], dtype=np.float32), device=tracker.device)
+    skip = first - lo // HOP_SAMPLES
+    return tracker.spect(piece)[skip : skip + (last - first)]
+
+
+def stream_logits(tracker, signal) -> tuple[np.ndarray, np.ndarray]:
+    """Beat and downbeat logits for a 22050 Hz mono `signal`, one model window at a time.
+
+    Same windows, zero padding and keep-first stitching as
+    `Audio2Frames.__call__` (so the logits match it), but each window's
+    spectrogram is computed from its own slice of the signal instead of
+    from a whole-track STFT. Working memory is one window (30 s) whatever
+    the track length; with the memory-mapped PCM from `audio_cache` the
+    signal itself is paged in a window at a time too.
+    """
+    import torch
+    import torch.nn.functional as F
+
+    n_frames = len(signal) // HOP_SAMPLES + 1
+    beat = np.full(n_frames, -1000.0, dtype=np.float32)
+    downbeat = np.full(n_frames, -1000.0, dtype=np.float32)
+    written = 0
+    with torch.inference_mode(), torch.autocast(enabled=tracker.float16, device_type=tracker.device.type):
+        for start in chunk_starts(n_frames):
+            first, last = max(start, 0), min(start + CHUNK_FRAMES, n_frames)
+            spect = _spect_frames(tracker, signal, first, last)
+            left = max(0, -start)
+            right = max(0, min(BORDER_FRAMES, start + CHUNK_FRAMES - n_frames))
+            if left or right:
+                spect = F.pad(spect, (0, 0, left, right), "constant", 0)
+            pred = tracker.model(spect.unsqueeze(0))
+            # Drop the borders; earlier windows keep the frames they share with later ones.
+            keep_from = max(start + BORDER_FRAMES, written)
+            keep_to = start + CHUNK_FRAMES - BORDER_FRAMES
+            offset = keep_from - start
+            count = min(keep_to, n_frames) - keep_from
+            if count > 0:
+                beat[keep_from : keep_from + count] = pred["beat"][0, offset : offset + count].float().cpu().numpy()
+                downbeat[keep_from : keep_from + count] = (
+                    pred["downbeat"][0, offset : offset + count].float().cpu().numpy()
+                )
+                written = keep_from + count
+    return beat, downbeat
+
+
+def logits_dir() -> pathlib.Path:
+    override = os.environ.get("LUMA_BEAT_LOGITS_DIR")
+    if override:
+        return pathlib.Path(override)
+    return pathlib.Path(__file__).resolve().parent / "beat_logits"
+
+
+def logits_sidecar(audio_file: pathlib.Path, checkpoint: str) -> pathlib.Path:
+    """Sidecar for `audio_file`'s logits, keyed by its content and the checkpoint that made them."""
+    import audio_cache
+
+    model = pathlib.Path(str(checkpoint)).stem
+    return logits_dir() / f"{audio_cache.content_hash(audio_file)}_{model}.beat_logits.bin"
+
+
+def save_logits(path: pathlib.Path, beat_logits, downbeat_logits) -> None:
+    """Write (beat, downbeat) logit pairs as raw float16, replacing `path` atomically."""
+    frames = np.stack([beat_logits, downbeat_logits], axis=1).astype(np.float16)
+    tmp = path.with_name(path.name + ".tmp")
+    try:
+        frames.tofile(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def load_logits(path: pathlib.Path) -> tuple[np.ndarray, np.ndarray]:
+    frames = np.fromfile(path, dtype=np.float16)
+    if frames.size == 0 or frames.size % 2:
+        raise ValueError(f"{path} is not a beat logits sidecar")
+    frames = frames.reshape(-1, 2).astype(np.float32)
+    return frames[:, 0], frames[:, 1]
+
+
+def solve(
+    beat_logits,
+    downbeat_logits,
+    bpm_min: float,
+    bpm_max: float,
+    variable_tempo: bool = False,
+    beats_per_bar: Iterable[int] = (4,),
+) -> dict:
+    """Fit the grid to beat_this logits and build the response payload."""
+    fit = variable_bpm_from_logits if variable_tempo else fixed_bpm_from_logits
+    result = fit(
+        beat_logits,
+        downbeat_logits,
+        HOP_SECONDS,
+        bpm_min=bpm_min,
+        bpm_max=bpm_max,
+        beats_per_bar_candidates=tuple(beats_per_bar),
+    )
+    payload = {
+        "beats": result.beats,
+        "downbeats": result.downbeats,
+        "bpm": result.bpm,
+        "downbeat_offset": result.offset,
+        "beats_per_bar": result.beats_per_bar,
+        "bpm_candidates": result.bpm_candidates,
+    }
+    if variable_tempo:
+        payload["tempo_segments"] = [vars(segment) for segment in result.tempo_segments]
+    return payload
+
+
+def analyse(
+    tracker,
+    audio_file: pathlib.Path,
+    bpm_min: float,
+    bpm_max: float,
+    variable_tempo: bool = False,
+    beats_per_bar: Iterable[int] = (4,),
+    keep_logits: bool = False,
+    checkpoint: str = "final0",
+) -> dict:
+    import audio_cache
+
+    # Decode straight to the model's 22050 Hz mono input via the shared PCM
+    # cache, so no downmix or resample is needed before inference.
+    signal = audio_cache.load(audio_file, BEAT_THIS_SR)
+    beat_logits, downbeat_logits = stream_logits(tracker, signal)
+    payload = solve(beat_logits, downbeat_logits, bpm_min, bpm_max, variable_tempo, beats_per_bar)
+    if keep_logits:
+        # The grid is already solved; a sidecar that can't be written only
+        # costs a later re-solve its shortcut.
+        try:
+            sidecar = logits_sidecar(audio_file, checkpoint)
+            sidecar.parent.mkdir(parents=True, exist_ok=True)
+            save_logits(sidecar, beat_logits, downbeat_logits)
+        except OSError as exc:
+            print(f"[beat_worker] could not save logits for {audio_file} ({exc})", file=sys.stderr, flush=True)
+        else:
+            payload["logits_path"] = str(sidecar)
+    return payload
+
+
+def serve(args: argparse.Namespace) -> int:
+    """Answer newline-delimited JSON requests until stdin closes."""
+    out = sys.stdout
+
+    def respond(payload: dict) -> None:
+        out.write(json.dumps(payload) + "\n")
+        out.flush()
+
+    # Stdout is the response channel; anything the model stack prints while
+    # loading or running goes to stderr instead.
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            tracker = load_tracker(args.checkpoint)
+        except Exception as exc:  # pragma: no cover - import error reporting
+            print(json.dumps({"error": f"Failed to load beat_this: {exc}"}), file=sys.stderr)
+            return 1
+        respond({"ready": True})
+
+        for line in sys.stdin:
+            if not line.strip():
+                continue
+            request_id = None
+            try:
+                request = json.loads(line)
+                request_id = request.get("id")
+                bpm_min = float(request.get("bpm_min", args.bpm_min))
+                bpm_max = float(request.get("bpm_max", args.bpm_max))
+                variable_tempo = bool(request.get("variable_tempo", args.variable_tempo))
+                beats_per_bar = [int(value) for value in request.get("beats_per_bar", args.beats_per_bar)]
+                if "logits_path" in request:
+                    beat_logits, downbeat_logits = load_logits(pathlib.Path(request["logits_path"]))
+                    payload = solve(beat_logits, downbeat_logits, bpm_min, bpm_max, variable_tempo, beats_per_bar)
+                else:
+                    audio_file = pathlib.Path(request["audio_file"])
+                    if not audio_file.exists():
+                        raise FileNotFoundError(f"Audio file does not exist: {audio_file}")
+                    payload = analyse(
+                        tracker,
+                        audio_file,
+                        bpm_min,
+                        bpm_max,
+                        variable_tempo,
+                        beats_per_bar,
+                        bool(request.get("save_logits", args.save_logits)),
+                        args.checkpoint,
+                    )
+            except Exception as exc:  # pragma: no cover - runtime error reporting
+                payload = {"error": str(exc)}
+            respond({"id": request_id, **payload})
+    return 0
+
+
 def main() -> int:
     args = parse_args()
 
+    if args.serve:
+        return serve(args)
+
+    if args.from_logits is not None:
+        try:
+            beat_logits, downbeat_logits = load_logits(args.from_logits)
+            payload = solve(
+                beat_logits, downbeat_logits, args.bpm_min, args.bpm_max, args.variable_tempo, args.beats_per_bar
+            )
+        except Exception as exc:  # pragma: no cover - runtime error reporting
+            print(json.dumps({"error": str(exc)}), file=sys.stderr)
+            return 1
+        sys.stdout.write(json.dumps(payload))
+        sys.stdout.flush()
+        return 0
+
     try:
-        from beat_this.inference import Audio2Frames
-        from beat_this.preprocessing import load_audio
+        import beat_this.inference  # noqa: F401
     except Exception as exc:  # pragma: no cover - import error reporting
         print(
             json.dumps({"error": f"Failed to import beat_this: {exc}"}),
@@ -170,28 +765,21 @@ def main() -> int:
         return 1
 
     try:
-        signal, sr = load_audio(args.audio_file)
-        tracker = Audio2Frames(checkpoint_path=str(args.checkpoint), device="cpu", float16=False)
-        beat_logits, downbeat_logits = tracker(signal, sr)
-        hop_seconds = 441 / 22050  # matches beat_this preprocessing
-        result = fixed_bpm_from_logits(
-            beat_logits.cpu().numpy(),
-            downbeat_logits.cpu().numpy(),
-            hop_seconds,
-            bpm_min=args.bpm_min,
-            bpm_max=args.bpm_max,
+        tracker = load_tracker(args.checkpoint)
+        payload = analyse(
+            tracker,
+            args.audio_file,
+            args.bpm_min,
+            args.bpm_max,
+            args.variable_tempo,
+            args.beats_per_bar,
+            args.save_logits,
+            args.checkpoint,
         )
     except Exception as exc:  # pragma: no cover - runtime error reporting
         print(json.dumps({"error": str(exc)}), file=sys.stderr)
         return 1
 
-    payload = {
-        "beats": result.beats,
-        "downbeats": result.downbeats,
-        "bpm": result.bpm,
-        "downbeat_offset": result.offset,
-        "beats_per_bar": result.beats_per_bar,
-    }
     sys.stdout.write(json.dumps(payload))
     sys.stdout.flush()
     return 0
@@ -8,10 +8,21 @@ Pipeline (all internal — MERT embeddings are NOT persisted, only predictions):
        arch from TANGO: AttentionPool → trunk MLP → intensity + tag heads).
     3. For each bar in the supplied bar_boundaries:
          - Slice the bar's audio (24 kHz mono).
-         - Forward through MERT, take hidden_states[layer 7].
+         - Forward through MERT's first 7 encoder layers (the rest are
+           dropped at load time), take the layer-7 output.
          - Forward those frames through the BarClassifier head.
        Emit one record per bar with intensity + per-tag sigmoid probabilities.
 
+    With `--encode window`, step 3 instead runs MERT over long overlapping
+    windows of the whole track and gathers each bar's frames from the
+    stitched layer-7 feature map before the head. `--compare-encoders`
+    runs both paths on one track and reports timing and prediction deltas.
+
+    `--quantize` runs MERT and the head trunk with dynamic int8 Linear
+    layers on CPU; `--check-quantization` scores the track (or, with no
+    track, a built-in synthetic reference clip) with both fp32 and int8
+    models and reports the accuracy delta and speedup.
+
 Why discard MERT features: the 768-d frame embeddings would dominate disk
 usage (~6 MB per track) yet aren't useful downstream of the classifier in
 Luma's lighting flow. Per the explicit user decision, we recompute MERT each
@@ -29,6 +40,7 @@ Legacy 9-tag labels (from `tango/data/models/bar_classifier.pt::tag_order`):
 
 CLI:
     classifier_worker.py <audio_file> <weights_file>
+    classifier_worker.py --manifest <weights_file>
 
 Bar boundaries are read from stdin as JSON:
     [[start_seconds, end_seconds], ...]
@@ -36,6 +48,14 @@ Bar boundaries are read from stdin as JSON:
 Stdin avoids a shared temp-file race when multiple classifier workers run
 concurrently — each child gets its own pipe.
 
+Manifest mode (backfills): MERT and the head are loaded once, then stdin is
+read as newline-delimited jobs and one result line is streamed per job as
+soon as that track finishes:
+    -> {"id": "t1", "audio_file": "/path/a.ogg", "bar_boundaries": [[0.0, 1.8], ...]}
+    <- {"id": "t1", "audio_file": "/path/a.ogg", "tag_order": [...], "bars": [...]}
+    <- {"id": "t2", "audio_file": "/path/b.ogg", "error": "..."}
+A failing job reports its error and the worker moves on to the next one.
+
 Output (stdout, JSON):
     {
       "tag_order": [...],
@@ -83,13 +103,60 @@ MERT_TARGET_SR = 24000
 MERT_LAYER = 7
 MIN_BAR_SAMPLES = MERT_TARGET_SR // 10  # < 100 ms = unreliable, skip.
 
+# `--check-quantization` bounds on int8 vs fp32 per-bar prediction error.
+QUANT_MAX_INTENSITY_DELTA = 0.25
+QUANT_MAX_TAG_DELTA = 0.05
+
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description=__doc__)
-    parser.add_argument("audio_file", type=pathlib.Path)
+    parser.add_argument("audio_file", type=pathlib.Path, nargs="?")
     parser.add_argument("weights_file", type=pathlib.Path)
-    parser.add_argument("--batch", type=int, default=8, help="bars per MERT forward pass")
-    return parser.parse_args()
+    parser.add_argument(
+        "--manifest",
+        action="store_true",
+        help="read newline-delimited {audio_file, bar_boundaries} jobs from stdin",
+    )
+    parser.add_argument("--batch", type=int, default=32, help="max bars per MERT forward pass")
+    parser.add_argument(
+        "--batch-seconds",
+        type=float,
+        default=16.0,
+        help="padded audio budget per MERT forward pass (longest bar x bar count)",
+    )
+    parser.add_argument(
+        "--encode",
+        choices=("bar", "window"),
+        default="bar",
+        help="bar: one MERT pass per bar slice; window: long overlapping windows with bars pooled from them",
+    )
+    parser.add_argument("--window-seconds", type=float, default=30.0, help="MERT window length for --encode window")
+    parser.add_argument(
+        "--window-context",
+        type=float,
+        default=5.0,
+        help="overlap discarded at each side of a window for --encode window",
+    )
+    parser.add_argument(
+        "--compare-encoders",
+        action="store_true",
+        help="run both encoders on the track and emit a timing / prediction-delta report instead",
+    )
+    parser.add_argument(
+        "--quantize",
+        action="store_true",
+        help="CPU inference with dynamic int8 Linear layers in MERT and the head trunk (int8 MERT cached)",
+    )
+    parser.add_argument(
+        "--check-quantization",
+        action="store_true",
+        help="score the track (default: the built-in reference clip) with fp32 and int8 models "
+        "and emit an accuracy / speed report instead",
+    )
+    args = parser.parse_args()
+    if args.audio_file is None and not (args.manifest or args.check_quantization):
+        parser.error("audio_file is required unless --manifest or --check-quantization is given")
+    return args
 
 
 def build_bar_classifier(input_dim: int, hidden_dim: int, n_tags: int, dropout: float):
@@ -153,15 +220,501 @@ def emit(payload: dict) -> None:
     sys.stdout.flush()
 
 
+class SchemaError(Exception):
+    """Checkpoint tag order differs from the legacy schema consumers expect."""
+
+
+def truncate_mert(mert) -> None:
+    """Drop the encoder layers after MERT_LAYER; nothing downstream reads them.
+
+    Inference then stops at the layer the head was trained on instead of
+    running (and keeping activations for) all 12 transformer layers.
+    """
+    mert.encoder.layers = mert.encoder.layers[:MERT_LAYER]
+    mert.config.num_hidden_layers = MERT_LAYER
+
+
+def mert_features(mert, inputs):
+    """hidden_states[MERT_LAYER] from a MERT truncated by `truncate_mert`."""
+    if getattr(mert.config, "do_stable_layer_norm", False):
+        # Pre-LN encoders apply a final LayerNorm to last_hidden_state, so
+        # the raw layer output has to come from hidden_states.
+        return mert(**inputs, output_hidden_states=True).hidden_states[MERT_LAYER]
+    return mert(**inputs).last_hidden_state
+
+
+def quantized_cache_path(weights_file: pathlib.Path) -> pathlib.Path:
+    """Where the int8 MERT state is cached, next to the bundled head weights.
+
+    Keyed by layer cut and torch version: packed int8 params aren't
+    guaranteed to load across torch releases.
+    """
+    import torch
+
+    version = torch.__version__.replace("+", "_")
+    return weights_file.parent / f"mert_v1_95m_l{MERT_LAYER}_int8_torch{version}.pt"
+
+
+def _load_quantized_mert(cache_path: pathlib.Path):
+    """Truncated MERT with dynamic int8 Linear layers, CPU only.
+
+    The first run quantizes the pretrained fp32 weights and caches the
+    resulting state dict; later runs build the architecture from config,
+    skip the fp32 weight load, and restore the cached int8 state directly.
+    """
+    import os
+    import tempfile
+
+    import torch
+    from torch import nn
+    from torch.ao.quantization import quantize_dynamic
+    from transformers import AutoConfig, AutoModel
+
+    if cache_path.exists():
+        try:
+            config = AutoConfig.from_pretrained(MERT_MODEL_ID, trust_remote_code=True)
+            mert = AutoModel.from_config(config, trust_remote_code=True).eval()
+            truncate_mert(mert)
+            mert = quantize_dynamic(mert, {nn.Linear}, dtype=torch.qint8)
+            mert.load_state_dict(torch.load(str(cache_path), map_location="cpu", weights_only=False))
+            print(f"[classifier] loaded int8 MERT from {cache_path}", file=sys.stderr, flush=True)
+            return mert
+        except Exception as exc:
+            print(f"[classifier] int8 cache unusable ({exc}); rebuilding", file=sys.stderr, flush=True)
+
+    mert = AutoModel.from_pretrained(MERT_MODEL_ID, trust_remote_code=True).eval()
+    truncate_mert(mert)
+    mert = quantize_dynamic(mert, {nn.Linear}, dtype=torch.qint8)
+    # Several workers may quantize at once: each writes its own temp file and
+    # the last rename wins. Failing to cache only costs the next run a rebuild.
+    try:
+        fd, tmp_name = tempfile.mkstemp(dir=cache_path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                torch.save(mert.state_dict(), fh)
+            os.replace(tmp_name, cache_path)
+        except BaseException:
+            pathlib.Path(tmp_name).unlink(missing_ok=True)
+            raise
+        print(f"[classifier] cached int8 MERT at {cache_path}", file=sys.stderr, flush=True)
+    except OSError as exc:
+        print(f"[classifier] could not cache int8 MERT ({exc})", file=sys.stderr, flush=True)
+    return mert
+
+
+def load_models(weights_file: pathlib.Path, device: str, quantize: bool = False):
+    """Load MERT, its feature extractor and the BarClassifier head.
+
+    `quantize` (CPU only) swaps the Linear layers of MERT and of the head's
+    trunk for dynamic int8 versions.
+    """
+    import torch
+    from transformers import AutoModel, Wav2Vec2FeatureExtractor
+
+    # MERT (heavy — ~400 MB on first run, then HF cache).
+    print(
+        f"[classifier] loading MERT ({MERT_MODEL_ID}) on {device}{' (int8)' if quantize else ''}",
+        file=sys.stderr,
+        flush=True,
+    )
+    if quantize:
+        mert = _load_quantized_mert(quantized_cache_path(weights_file))
+    else:
+        mert = AutoModel.from_pretrained(MERT_MODEL_ID, trust_remote_code=True).eval().to(device)
+        truncate_mert(mert)
+    for p in mert.parameters():
+        p.requires_grad_(False)
+    processor = Wav2Vec2FeatureExtractor.from_pretrained(MERT_MODEL_ID, trust_remote_code=True)
+
+    # BarClassifier head from bundled .pt.
+    ckpt = torch.load(str(weights_file), map_location=device, weights_only=False)
+    cfg = ckpt["config"]
+    tag_order = ckpt.get("tag_order") or LEGACY_TAG_ORDER
+    if list(tag_order) != LEGACY_TAG_ORDER:
+        # Defensive — protect downstream JSON consumers from silent schema drift.
+        raise SchemaError(f"Checkpoint tag_order {tag_order} does not match expected legacy schema")
+    head = build_bar_classifier(
+        input_dim=int(cfg["input_dim"]),
+        hidden_dim=int(cfg["hidden_dim"]),
+        n_tags=int(cfg["n_tags"]),
+        dropout=float(cfg.get("dropout", 0.2)),
+    ).to(device)
+    head.load_state_dict(ckpt["state_dict"])
+    head.eval()
+    if quantize:
+        from torch.ao.quantization import quantize_dynamic
+
+        head.trunk = quantize_dynamic(head.trunk, {torch.nn.Linear}, dtype=torch.qint8)
+    return mert, processor, head
+
+
+def batch_samples(args: argparse.Namespace) -> int:
+    return max(1, round(args.batch_seconds * MERT_TARGET_SR))
+
+
+def schedule_batches(lengths: list[int], max_samples: int, max_bars: int) -> list[list[int]]:
+    """Group bars into forward passes by length instead of input order.
+
+    Bars are sorted by sample count and packed greedily while
+    `len(batch) * longest_bar` stays within `max_samples`, so each batch
+    pads only to a neighbour of similar length. A single bar longer than
+    the budget gets a batch of its own. Returns positions into `lengths`.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    batches: list[list[int]] = []
+    current: list[int] = []
+    for i in order:
+        # Ascending order: the bar being added is the batch's longest.
+        if current and ((len(current) + 1) * lengths[i] > max_samples or len(current) >= max_bars):
+            batches.append(current)
+            current = []
+        current.append(i)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _bar_record(bar_idx: int, start: float, end: float, intensity: float, probs) -> dict:
+    preds = {"intensity": float(intensity)}
+    for ti, tag_name in enumerate(LEGACY_TAG_ORDER):
+        preds[tag_name] = float(probs[ti])
+    return {"bar_idx": int(bar_idx), "start": start, "end": end, "predictions": preds}
+
+
+def _bar_spans(boundaries: list, total_samples: int) -> list[tuple[int, float, float, int, int]]:
+    """(bar_idx, start_s, end_s, start_sample, end_sample) for every scoreable bar."""
+    spans = []
+    for bar_idx, (start_s, end_s) in enumerate(boundaries):
+        s = max(0, round(float(start_s) * MERT_TARGET_SR))
+        e = min(total_samples, round(float(end_s) * MERT_TARGET_SR))
+        if e - s < MIN_BAR_SAMPLES:
+            continue
+        spans.append((bar_idx, float(start_s), float(end_s), s, e))
+    return spans
+
+
+def classify_track(
+    models, device: str, audio_file: pathlib.Path, boundaries: list, args: argparse.Namespace
+) -> list[dict]:
+    """Score every bar of one track; bars shorter than MIN_BAR_SAMPLES are skipped."""
+    import audio_cache
+
+    # Load audio once (decoded PCM is shared across workers); bar
+    # segmentation happens per-bar.
+    y = audio_cache.load(audio_file, MERT_TARGET_SR)
+    return classify_samples(models, device, y, boundaries, args)
+
+
+def classify_samples(models, device: str, y, boundaries: list, args: argparse.Namespace) -> list[dict]:
+    """`classify_track` for audio already decoded at MERT_TARGET_SR."""
+    spans = _bar_spans(boundaries, len(y))
+    if args.encode == "window":
+        bars_out = _classify_windowed(models, device, y, spans, args)
+    else:
+        bars_out = _classify_per_bar(models, device, y, spans, args)
+    # Batches run out of track order; hand bars back sorted by bar_idx.
+    bars_out.sort(key=lambda bar: bar["bar_idx"])
+    return bars_out
+
+
+def _classify_per_bar(models, device: str, y, spans: list, args: argparse.Namespace) -> list[dict]:
+    """Run MERT separately on each bar's slice, length-bucketed into batches."""
+    import numpy as np
+    import torch
+
+    mert, processor, head = models
+
+    segments = [y[s:e].astype(np.float32) for _, _, _, s, e in spans]
+    lengths = [len(seg) for seg in segments]
+    batches = schedule_batches(lengths, batch_samples(args), args.batch)
+    padded = sum(len(batch) * max(lengths[i] for i in batch) for batch in batches)
+    print(
+        f"[classifier] {len(segments)} bars in {len(batches)} batches "
+        f"({100.0 * (1.0 - sum(lengths) / max(padded, 1)):.1f}% padding)",
+        file=sys.stderr,
+        flush=True,
+    )
+
+    bars_out: list[dict] = []
+    for batch in batches:
+        audios = [segments[i] for i in batch]
+        inputs = processor(audios, sampling_rate=MERT_TARGET_SR, return_tensors="pt", padding=True).to(device)
+        with torch.no_grad():
+            feats = mert_features(mert, inputs)  # (B, T_max, 768)
+
+            if "attention_mask" in inputs:
+                sample_lens = inputs["attention_mask"].sum(-1)
+            else:
+                sample_lens = torch.tensor([a.shape[0] for a in audios], device=device)
+            frame_lens = mert._get_feat_extract_output_lengths(sample_lens)
+
+            # Build (T_max) frame mask per row from frame_lens.
+            t_max = feats.shape[1]
+            arange = torch.arange(t_max, device=device).unsqueeze(0)  # (1, T_max)
+            frame_mask = arange < frame_lens.unsqueeze(1)  # (B, T_max)
+
+            intensity, tag_logits = head(feats, frame_mask)
+            intensity = intensity.clamp(0.0, 5.0).cpu().numpy()
+            probs = torch.sigmoid(tag_logits).cpu().numpy()
+
+        for j, i in enumerate(batch):
+            bar_idx, start_s, end_s, _, _ = spans[i]
+            bars_out.append(_bar_record(bar_idx, start_s, end_s, intensity[j], probs[j]))
+    return bars_out
+
+
+def _classify_windowed(models, device: str, y, spans: list, args: argparse.Namespace) -> list[dict]:
+    """Run MERT over long overlapping windows and pool each bar from the stitched frames.
+
+    Each window contributes only its core (the frames outside the
+    `--window-context` margins), so every frame is computed with context on
+    both sides except at the track edges. Bars are pooled as soon as the
+    frames they span are complete and consumed frames are dropped, which
+    keeps the feature buffer to roughly one window regardless of length.
+    The feature extractor normalises each window rather than each bar, so
+    predictions are not expected to match `_classify_per_bar` exactly.
+    """
+    import math
+
+    import numpy as np
+    import torch
+
+    mert, processor, head = models
+
+    # Samples per MERT frame (product of conv strides: 320 at 24 kHz = 75 Hz).
+    frame_hop = math.prod(mert.config.conv_stride)
+    total_samples = len(y)
+    total_frames = int(mert._get_feat_extract_output_lengths(torch.tensor(total_samples)))
+
+    context = round(args.window_context * MERT_TARGET_SR) // frame_hop * frame_hop
+    core = round(args.window_seconds * MERT_TARGET_SR) // frame_hop * frame_hop - 2 * context
+    if core <= 0:
+        raise ValueError("--window-seconds must exceed twice --window-context")
+
+    # (span position, first frame, end frame), in track order.
+    pending = []
+    for pos, (_, _, _, s, e) in enumerate(spans):
+        f0 = s // frame_hop
+        f1 = min(total_frames, f0 + int(mert._get_feat_extract_output_lengths(torch.tensor(e - s))))
+        pending.append((pos, f0, f1))
+    pending.sort(key=lambda bar: bar[1])
+
+    n_windows = max(1, math.ceil(total_samples / core))
+    print(
+        f"[classifier] {len(spans)} bars from {n_windows} MERT windows "
+        f"({args.window_seconds:g}s, {args.window_context:g}s context)",
+        file=sys.stderr,
+        flush=True,
+    )
+
+    bars_out: list[dict] = []
+    buf = None  # (T, 768) frames starting at global frame `buf_start`
+    buf_start = 0
+    for w in range(n_windows):
+        core_start = w * core
+        win_start = max(0, core_start - context)
+        win_end = min(total_samples, core_start + core + context)
+        inputs = processor(
+            y[win_start:win_end].astype(np.float32), sampling_rate=MERT_TARGET_SR, return_tensors="pt"
+        ).to(device)
+        with torch.no_grad():
+            feats = mert_features(mert, inputs)[0]  # (T_win, 768)
+
+        lo = (core_start - win_start) // frame_hop
+        hi = lo + core // frame_hop if w < n_windows - 1 else feats.shape[0]
+        chunk = feats[lo:hi]
+        if chunk.shape[0] < hi - lo:
+            # The conv stack can drop the core's final frame when the right
+            # margin is shorter than one receptive field; repeat the edge frame.
+            chunk = torch.cat([chunk, chunk[-1:].expand(hi - lo - chunk.shape[0], -1)])
+        buf = chunk if buf is None else torch.cat([buf, chunk])
+        covered = total_frames if w == n_windows - 1 else buf_start + buf.shape[0]
+
+        ready = [bar for bar in pending if bar[2] <= covered]
+        pending = [bar for bar in pending if bar[2] > covered]
+        for i in range(0, len(ready), args.batch):
+            chunk_bars = ready[i : i + args.batch]
+            t_max = max(f1 - f0 for _, f0, f1 in chunk_bars)
+            x = buf.new_zeros((len(chunk_bars), t_max, buf.shape[1]))
+            mask = torch.zeros((len(chunk_bars), t_max), dtype=torch.bool, device=buf.device)
+            for j, (_, f0, f1) in enumerate(chunk_bars):
+                rows = buf[f0 - buf_start : f1 - buf_start]
+                x[j, : rows.shape[0]] = rows
+                mask[j, : rows.shape[0]] = True
+            with torch.no_grad():
+                intensity, tag_logits = head(x, mask)
+                intensity = intensity.clamp(0.0, 5.0).cpu().numpy()
+                probs = torch.sigmoid(tag_logits).cpu().numpy()
+            for j, (pos, _, _) in enumerate(chunk_bars):
+                bar_idx, start_s, end_s, _, _ = spans[pos]
+                bars_out.append(_bar_record(bar_idx, start_s, end_s, intensity[j], probs[j]))
+
+        keep_from = min((f0 for _, f0, _ in pending), default=buf_start + buf.shape[0])
+        buf = buf[keep_from - buf_start :]
+        buf_start = keep_from
+    return bars_out
+
+
+def _prediction_deltas(reference: list[dict], candidate: list[dict]) -> dict:
+    """Per-bar prediction error of `candidate` against `reference`."""
+    import numpy as np
+
+    by_idx = {bar["bar_idx"]: bar["predictions"] for bar in candidate}
+    pairs = [(bar["predictions"], by_idx[bar["bar_idx"]]) for bar in reference if bar["bar_idx"] in by_idx]
+    if not pairs:
+        raise ValueError("No bars were scored by both runs")
+    intensity_err = np.array([abs(a["intensity"] - b["intensity"]) for a, b in pairs])
+    tag_err = np.array([[abs(a[t] - b[t]) for t in LEGACY_TAG_ORDER] for a, b in pairs])
+    tag_agree = np.array([[(a[t] >= 0.5) == (b[t] >= 0.5) for t in LEGACY_TAG_ORDER] for a, b in pairs])
+    return {
+        "bars": len(pairs),
+        "intensity_mae": float(intensity_err.mean()),
+        "intensity_max_abs": float(intensity_err.max()),
+        "tag_mae": {t: float(tag_err[:, ti].mean()) for ti, t in enumerate(LEGACY_TAG_ORDER)},
+        "tag_max_abs": float(tag_err.max()),
+        "tag_decision_agreement": float(tag_agree.mean()),
+    }
+
+
+def compare_encoders(
+    models, device: str, audio_file: pathlib.Path, boundaries: list, args: argparse.Namespace
+) -> dict:
+    """Run both encoders on one track and report wall time plus per-bar prediction deltas."""
+    import time
+
+    results, timings = {}, {}
+    for mode in ("bar", "window"):
+        t0 = time.perf_counter()
+        mode_args = argparse.Namespace(**{**vars(args), "encode": mode})
+        results[mode] = classify_track(models, device, audio_file, boundaries, mode_args)
+        timings[mode] = time.perf_counter() - t0
+
+    return {
+        "seconds": {mode: round(t, 3) for mode, t in timings.items()},
+        "speedup": round(timings["bar"] / max(timings["window"], 1e-9), 2),
+        **_prediction_deltas(results["bar"], results["window"]),
+    }
+
+
+def reference_clip(seconds_per_bar: float = 2.0, bars: int = 16):
+    """Seeded synthetic clip (24 kHz mono) and bar boundaries for `--check-quantization`.
+
+    Four sections cycle kick + bass, then hats and a chord pad on top, then
+    the pad alone, then everything, so the head is scored on varied bars
+    without shipping audio.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    n = round(seconds_per_bar * bars * MERT_TARGET_SR)
+    t = np.arange(n) / MERT_TARGET_SR
+    beat = seconds_per_bar / 4
+    phase = np.mod(t, beat)
+    section = (t // (seconds_per_bar * bars / 4)).astype(int) % 4
+    kick = np.sin(2 * np.pi * 55.0 * phase) * np.exp(-phase * 30.0)
+    hats = rng.standard_normal(n) * np.exp(-np.mod(t - beat / 2, beat) * 80.0)
+    bass = np.sin(2 * np.pi * 55.0 * t) * 0.5
+    pad = sum(np.sin(2 * np.pi * f * t) for f in (220.0, 277.2, 329.6)) / 3
+    y = np.where(section == 2, 0.0, kick + bass) + np.where(section % 2 == 1, 0.3 * hats + 0.4 * pad, 0.0)
+    y += np.where(section == 2, 0.6 * pad, 0.0)
+    y = (0.5 * y / np.abs(y).max()).astype(np.float32)
+    boundaries = [[i * seconds_per_bar, (i + 1) * seconds_per_bar] for i in range(bars)]
+    return y, boundaries
+
+
+def within_quantization_tolerance(deltas: dict) -> bool:
+    """True when no bar moved by more than QUANT_MAX_INTENSITY_DELTA / QUANT_MAX_TAG_DELTA."""
+    return deltas["intensity_max_abs"] <= QUANT_MAX_INTENSITY_DELTA and deltas["tag_max_abs"] <= QUANT_MAX_TAG_DELTA
+
+
+def check_quantization(y, boundaries: list, args: argparse.Namespace) -> dict:
+    """Score a clip with fp32 and int8 models on CPU and compare (see `within_quantization_tolerance`)."""
+    import time
+
+    results, timings = {}, {}
+    for name, quantize in (("fp32", False), ("int8", True)):
+        models = load_models(args.weights_file, "cpu", quantize=quantize)
+        t0 = time.perf_counter()
+        results[name] = classify_samples(models, "cpu", y, boundaries, args)
+        timings[name] = time.perf_counter() - t0
+        del models
+
+    deltas = _prediction_deltas(results["fp32"], results["int8"])
+    return {
+        "seconds": {name: round(t, 3) for name, t in timings.items()},
+        "speedup": round(timings["fp32"] / max(timings["int8"], 1e-9), 2),
+        **deltas,
+        "within_tolerance": within_quantization_tolerance(deltas),
+    }
+
+
+def run_manifest(args: argparse.Namespace) -> int:
+    """Stream one result line per newline-delimited job read from stdin."""
+    out = sys.stdout
+
+    def respond(payload: dict) -> None:
+        out.write(json.dumps(payload) + "\n")
+        out.flush()
+
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            import torch
+        except Exception as exc:  # pragma: no cover - import error reporting
+            print(json.dumps({"error": f"Missing python deps for classifier: {exc}"}), file=sys.stderr)
+            return 1
+
+        # Dynamic int8 kernels are CPU-only.
+        device = "cuda" if torch.cuda.is_available() and not args.quantize else "cpu"
+        try:
+            models = load_models(args.weights_file, device, quantize=args.quantize)
+        except Exception as exc:  # pragma: no cover - runtime error reporting
+            print(json.dumps({"error": str(exc)}), file=sys.stderr)
+            return 1
+
+        for line in sys.stdin:
+            if not line.strip():
+                continue
+            job_id, audio_file = None, None
+            try:
+                job = json.loads(line)
+                job_id = job.get("id")
+                audio_file = job["audio_file"]
+                boundaries = job["bar_boundaries"]
+                if not pathlib.Path(audio_file).exists():
+                    raise FileNotFoundError(f"Audio file does not exist: {audio_file}")
+                if not isinstance(boundaries, list) or not boundaries:
+                    raise ValueError("bar_boundaries must be a non-empty list")
+                bars = classify_track(models, device, pathlib.Path(audio_file), boundaries, args)
+                payload = {"tag_order": LEGACY_TAG_ORDER, "bars": bars}
+            except Exception as exc:  # pragma: no cover - runtime error reporting
+                payload = {"error": str(exc)}
+            respond({"id": job_id, "audio_file": audio_file, **payload})
+    return 0
+
+
 def main() -> int:
     args = parse_args()
 
-    if not args.audio_file.exists():
+    if args.audio_file is not None and not args.audio_file.exists():
         print(json.dumps({"error": f"Audio file does not exist: {args.audio_file}"}), file=sys.stderr)
         return 1
     if not args.weights_file.exists():
         print(json.dumps({"error": f"Weights file does not exist: {args.weights_file}"}), file=sys.stderr)
         return 1
+    if args.manifest:
+        return run_manifest(args)
+
+    if args.audio_file is None:
+        # --check-quantization on the built-in reference clip.
+        with contextlib.redirect_stdout(sys.stderr):
+            try:
+                y, boundaries = reference_clip()
+                report = check_quantization(y, boundaries, args)
+            except Exception as exc:  # pragma: no cover - runtime error reporting
+                print(json.dumps({"error": str(exc)}), file=sys.stderr)
+                return 1
+        emit(report)
+        return 0
 
     boundaries_raw = sys.stdin.read()
     if not boundaries_raw.strip():
@@ -172,13 +725,11 @@ def main() -> int:
     # warnings to stdout. Stdout is reserved for our JSON payload, so route
     # everything else to stderr while we work; final `emit()` writes the JSON
     # outside this block.
-    bars_out: list[dict] = []
     with contextlib.redirect_stdout(sys.stderr):
         try:
-            import librosa
-            import numpy as np
+            import librosa  # noqa: F401
             import torch
-            from transformers import AutoModel, Wav2Vec2FeatureExtractor
+            import transformers  # noqa: F401
         except Exception as exc:  # pragma: no cover - import error reporting
             print(json.dumps({"error": f"Missing python deps for classifier: {exc}"}), file=sys.stderr)
             return 1
@@ -188,88 +739,29 @@ def main() -> int:
             print(json.dumps({"error": "bar_boundaries_json must be a non-empty list"}), file=sys.stderr)
             return 1
 
-        device = "cuda" if torch.cuda.is_available() else "cpu"
+        # Dynamic int8 kernels are CPU-only.
+        device = "cuda" if torch.cuda.is_available() and not args.quantize else "cpu"
 
+        report = None
         try:
-            # MERT (heavy — ~400 MB on first run, then HF cache).
-            print(f"[classifier] loading MERT ({MERT_MODEL_ID}) on {device}", file=sys.stderr, flush=True)
-            mert = AutoModel.from_pretrained(MERT_MODEL_ID, trust_remote_code=True).eval().to(device)
-            for p in mert.parameters():
-                p.requires_grad_(False)
-            processor = Wav2Vec2FeatureExtractor.from_pretrained(MERT_MODEL_ID, trust_remote_code=True)
-
-            # BarClassifier head from bundled .pt.
-            ckpt = torch.load(str(args.weights_file), map_location=device, weights_only=False)
-            cfg = ckpt["config"]
-            tag_order = ckpt.get("tag_order") or LEGACY_TAG_ORDER
-            if list(tag_order) != LEGACY_TAG_ORDER:
-                # Defensive — protect downstream JSON consumers from silent schema drift.
-                print(
-                    json.dumps(
-                        {"error": f"Checkpoint tag_order {tag_order} does not match expected legacy schema"}
-                    ),
-                    file=sys.stderr,
-                )
-                return 1
-            head = build_bar_classifier(
-                input_dim=int(cfg["input_dim"]),
-                hidden_dim=int(cfg["hidden_dim"]),
-                n_tags=int(cfg["n_tags"]),
-                dropout=float(cfg.get("dropout", 0.2)),
-            ).to(device)
-            head.load_state_dict(ckpt["state_dict"])
-            head.eval()
-
-            # Load audio once; bar segmentation happens per-bar.
-            y, _ = librosa.load(str(args.audio_file), sr=MERT_TARGET_SR, mono=True)
-            total_samples = len(y)
-
-            for batch_start in range(0, len(boundaries), args.batch):
-                batch = list(enumerate(boundaries))[batch_start : batch_start + args.batch]
-                audios: list[np.ndarray] = []
-                keep: list[tuple[int, float, float]] = []
-                for bar_idx, (start_s, end_s) in batch:
-                    s = max(0, round(float(start_s) * MERT_TARGET_SR))
-                    e = min(total_samples, round(float(end_s) * MERT_TARGET_SR))
-                    seg = y[s:e]
-                    if len(seg) < MIN_BAR_SAMPLES:
-                        continue
-                    audios.append(seg.astype(np.float32))
-                    keep.append((bar_idx, float(start_s), float(end_s)))
-                if not audios:
-                    continue
-
-                inputs = processor(
-                    audios, sampling_rate=MERT_TARGET_SR, return_tensors="pt", padding=True
-                ).to(device)
-                with torch.no_grad():
-                    outputs = mert(**inputs, output_hidden_states=True)
-                    feats = outputs.hidden_states[MERT_LAYER]  # (B, T_max, 768)
-
-                    if "attention_mask" in inputs:
-                        sample_lens = inputs["attention_mask"].sum(-1)
-                    else:
-                        sample_lens = torch.tensor([a.shape[0] for a in audios], device=device)
-                    frame_lens = mert._get_feat_extract_output_lengths(sample_lens)
-
-                    # Build (T_max) frame mask per row from frame_lens.
-                    t_max = feats.shape[1]
-                    arange = torch.arange(t_max, device=device).unsqueeze(0)  # (1, T_max)
-                    frame_mask = arange < frame_lens.unsqueeze(1)  # (B, T_max)
-
-                    intensity, tag_logits = head(feats, frame_mask)
-                    intensity = intensity.clamp(0.0, 5.0).cpu().numpy()
-                    probs = torch.sigmoid(tag_logits).cpu().numpy()
-
-                for j, (bar_idx, s, e) in enumerate(keep):
-                    preds = {"intensity": float(intensity[j])}
-                    for ti, tag_name in enumerate(LEGACY_TAG_ORDER):
-                        preds[tag_name] = float(probs[j, ti])
-                    bars_out.append({"bar_idx": int(bar_idx), "start": s, "end": e, "predictions": preds})
+            if args.check_quantization:
+                import audio_cache
+
+                y = audio_cache.load(args.audio_file, MERT_TARGET_SR)
+                report = check_quantization(y, boundaries, args)
+            else:
+                models = load_models(args.weights_file, device, quantize=args.quantize)
+                if args.compare_encoders:
+                    report = compare_encoders(models, device, args.audio_file, boundaries, args)
+                else:
+                    bars_out = classify_track(models, device, args.audio_file, boundaries, args)
         except Exception as exc:  # pragma: no cover - runtime error reporting
             print(json.dumps({"error": str(exc)}), file=sys.stderr)
             return 1
 
+    if report is not None:
+        emit(report)
+        return 0
     emit({"tag_order": LEGACY_TAG_ORDER, "bars": bars_out})
     return 0
 
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""Content-addressed store of separated stems.
+
+The same audio often reaches the stem worker under several track records
+(duplicates across crates, re-imports after a database reset). Entries are
+keyed by (audio content hash, Demucs model, separation options), so any
+later request for that audio with the same settings is served from the
+store instead of re-running Demucs.
+
+Layout: `<cache_dir>/<key>/<stem>.ogg|.wav` plus `manifest.json`, which
+records the model's full source list and each stored file's size and
+content hash (`audio_cache.content_hash`). Lookups re-hash the requested
+files against the manifest and drop entries that fail, so a truncated or
+modified file is never served. An entry may hold only some stems (from `--stems` runs); later
+runs add the missing ones.
+
+Materialisation into the caller's directory prefers a hard link, then a
+reflink (FICLONE on Linux, clonefile via `cp -c` on macOS), then a plain
+copy. Hard-linked stems stay valid when the target directory is later
+replaced, because that only unlinks its names.
+
+Eviction is LRU by manifest mtime (refreshed on every hit): after each
+store the oldest entries are removed until the store fits its budget.
+
+Environment:
+    LUMA_STEM_CACHE_DIR        store directory (default: `stem_cache/`)
+    LUMA_STEM_CACHE_MAX_BYTES  size budget (default 4 GiB, about 25 tracks
+                               of 4-stem 16-bit WAV)
+    LUMA_STEM_CACHE=0          bypass the store; separated stems are still
+                               published to the caller's directory
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import audio_cache
+
+DEFAULT_MAX_BYTES = 4 * 1024**3
+MANIFEST_NAME = "manifest.json"
+STEM_SUFFIXES = (".ogg", ".wav")
+_FICLONE = 0x40049409
+
+
+def cache_dir() -> pathlib.Path:
+    return audio_cache.env_dir("LUMA_STEM_CACHE_DIR", "stem_cache")
+
+
+def max_bytes() -> int:
+    return audio_cache.env_bytes("LUMA_STEM_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)
+
+
+def enabled() -> bool:
+    return os.environ.get("LUMA_STEM_CACHE", "1") != "0"
+
+
+def entry_key(audio_hash: str, model: str, options: dict) -> str:
+    """Store key for `audio_hash` separated by `model` with `options`."""
+    spec = json.dumps({"audio": audio_hash, "model": model, "options": options}, sort_keys=True)
+    return hashlib.blake2b(spec.encode(), digest_size=16).hexdigest()
+
+
+def _read_manifest(entry: pathlib.Path) -> dict | None:
+    try:
+        with open(entry / MANIFEST_NAME) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(entry: pathlib.Path, manifest: dict) -> None:
+    fd, tmp_name = tempfile.mkstemp(dir=entry, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as fh:
+            json.dump(manifest, fh)
+        os.replace(tmp_name, entry / MANIFEST_NAME)
+    except BaseException:
+        pathlib.Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+def _reflink(src: pathlib.Path, dst: pathlib.Path) -> bool:
+    if sys.platform == "darwin":
+        return subprocess.run(["cp", "-c", str(src), str(dst)], capture_output=True).returncode == 0
+    if sys.platform.startswith("linux"):
+        import fcntl
+
+        try:
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+            return True
+        except OSError:
+            dst.unlink(missing_ok=True)
+    return False
+
+
+def _place(src: pathlib.Path, dst: pathlib.Path) -> str:
+    """Link, reflink or copy `src` to the (absent) `dst`; return which."""
+    try:
+        os.link(src, dst)
+        return "hardlink"
+    except OSError:
+        pass
+    if _reflink(src, dst):
+        return "reflink"
+    shutil.copyfile(src, dst)
+    return "copy"
+
+
+def lookup(key: str, stems: list[str] | None = None) -> tuple[dict[str, pathlib.Path], list[str]] | None:
+    """Verified stored files for `stems` (default: every source), or None on a miss.
+
+    Returns ({stem name: stored path}, the model's full source list).
+    """
+    if not enabled():
+        return None
+    entry = cache_dir() / key
+    manifest = _read_manifest(entry)
+    if manifest is None:
+        return None
+    sources = manifest.get("sources", [])
+    wanted = sources if stems is None else stems
+    records = manifest.get("files", {})
+    if not wanted or any(name not in records for name in wanted):
+        return None
+
+    files = {}
+    for name in wanted:
+        record = records[name]
+        path = entry / record["file"]
+        try:
+            intact = (
+                path.stat().st_size == record["size"] and audio_cache.content_hash(path) == record["blake2b"]
+            )
+        except OSError:
+            intact = False
+        if not intact:
+            print(f"[stem_cache] dropping corrupt entry {key} ({name})", file=sys.stderr, flush=True)
+            shutil.rmtree(entry, ignore_errors=True)
+            return None
+        files[name] = path
+    os.utime(entry / MANIFEST_NAME)
+    return files, sources
+
+
+def materialize(files: dict[str, pathlib.Path], target_dir: pathlib.Path) -> None:
+    """Place stored stems into `target_dir` under their stored file names."""
+    target_dir.mkdir(parents=True, exist_ok=True)
+    for name, src in files.items():
+        dst = target_dir / src.name
+        dst.unlink(missing_ok=True)
+        how = _place(src, dst)
+        print(f"[stem_cache] {name} -> {dst} ({how})", file=sys.stderr, flush=True)
+
+
+def store(key: str, files: dict[str, pathlib.Path], sources: list[str]) -> None:
+    """Add freshly written stems ({name: path}) to the entry for `key`."""
+    if not enabled() or not files:
+        return
+    directory = cache_dir()
+    entry = directory / key
+    entry.mkdir(parents=True, exist_ok=True)
+    manifest = _read_manifest(entry) or {}
+    records = manifest.get("files", {})
+    for name, src in files.items():
+        tmp = entry / f"{src.name}.{os.getpid()}.tmp"
+        tmp.unlink(missing_ok=True)
+        try:
+            _place(src, tmp)
+            os.replace(tmp, entry / src.name)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        for suffix in STEM_SUFFIXES:
+            stale = entry / f"{name}{suffix}"
+            if stale.name != src.name:
+                stale.unlink(missing_ok=True)
+        stored = entry / src.name
+        records[name] = {
+            "file": src.name,
+            "size": stored.stat().st_size,
+            "blake2b": audio_cache.content_hash(stored),
+        }
+    _write_manifest(entry, {"sources": list(sources), "files": records})
+    _evict(directory, max_bytes(), keep=entry)
+
+
+def _entry_size(entry: pathlib.Path) -> int:
+    total = 0
+    for path in entry.iterdir():
+        try:
+            total += path.stat().st_size
+        except FileNotFoundError:
+            pass
+    return total
+
+
+def _evict(directory: pathlib.Path, budget: int, keep: pathlib.Path) -> None:
+    entries = []
+    for entry in directory.iterdir():
+        try:
+            mtime = (entry / MANIFEST_NAME).stat().st_mtime
+            size = _entry_size(entry)
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        entries.append((mtime, size, entry))
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries):
+        if total <= budget:
+            break
+        if entry == keep:
+            continue
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
@@ -0,0 +1,6 @@
+"""Workers are shipped as top-level scripts, so tests import them the same way."""
+
+import pathlib
+import sys
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+import torch
+
+import ace_chord_sections_worker as ace
+
+SR = 22050
+HOP = 512
+CHUNK_DUR = 20.0
+
+
+def _mixdown(seconds: float) -> np.ndarray:
+    # Not a whole number of chunks or hops, so the last chunk is padded.
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * SR)) / SR
+    y = 0.4 * np.sin(2 * np.pi * 220.0 * t) + 0.2 * np.sin(2 * np.pi * 329.6 * t)
+    return (y + 0.05 * rng.standard_normal(t.shape)).astype(np.float32)
+
+
+class _FrameChunker:
+    """Stand-in for ACE's AudioChunkProcessor: zero-padded chunks, one feature frame per HOP samples."""
+
+    def __init__(self, audio: np.ndarray):
+        self.audio = torch.from_numpy(audio)
+        self.chunk_samples = int(CHUNK_DUR * SR)
+
+    def process_chunk(self, onset: float):
+        start = int(round(onset * SR))
+        if start >= len(self.audio):
+            return None
+        chunk = self.audio[start : start + self.chunk_samples]
+        chunk = torch.nn.functional.pad(chunk, (0, self.chunk_samples - len(chunk)))
+        return chunk[: len(chunk) // HOP * HOP].reshape(-1, HOP).t()[None]  # [1, F, T]
+
+
+class _FakeAce(torch.nn.Module):
+    """Predicts from each frame's mean, dropping `trim` frames per chunk."""
+
+    def __init__(self, trim: int = 0):
+        super().__init__()
+        self.scale = torch.nn.Parameter(torch.ones(1))
+        self.trim = trim
+
+    def forward(self, x: torch.Tensor) -> dict:
+        frames = x.mean(dim=(1, 2)) * self.scale  # [B, T]
+        frames = frames[:, : frames.shape[1] - self.trim]
+        return {
+            "root": frames[..., None].expand(-1, -1, 13),
+            "bass": frames[..., None].expand(-1, -1, 13),
+            "onehot": frames[..., None].expand(-1, -1, 12),
+        }
+
+
+def _walk(model, batch_chunks: int):
+    y = _mixdown(95.3)
+    chunker = _FrameChunker(y)
+    return [
+        (onset, root.detach().numpy())
+        for onset, root, _, _ in ace.iter_chunk_logits(
+            model, chunker, len(y) / SR, CHUNK_DUR, HOP / SR, batch_chunks
+        )
+    ]
+
+
+def _assert_same_walk(actual, expected):
+    assert [onset for onset, _ in actual] == pytest.approx([onset for onset, _ in expected])
+    for (_, a), (_, b) in zip(actual, expected):
+        np.testing.assert_allclose(a, b, rtol=1e-6, atol=1e-6)
+
+
+def test_batched_chunks_match_serial_walk():
+    model = _FakeAce().eval()
+    _assert_same_walk(_walk(model, batch_chunks=8), _walk(model, batch_chunks=1))
+
+
+def test_batched_chunks_fall_back_to_serial_on_frame_mismatch(capsys):
+    model = _FakeAce(trim=3).eval()
+    _assert_same_walk(_walk(model, batch_chunks=8), _walk(model, batch_chunks=1))
+    assert "continuing with --batch-chunks 1" in capsys.readouterr().err
@@ -0,0 +1,49 @@
+import os
+import pathlib
+import time
+
+import audio_cache
+
+
+def _entry(directory: pathlib.Path, name: str, size: int, mtime: int) -> pathlib.Path:
+    path = directory / name
+    path.write_bytes(b"\0" * size)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_evict_skips_entries_that_cannot_be_removed(tmp_path, monkeypatch):
+    locked = _entry(tmp_path, "a.npy", 100, 1)
+    older = _entry(tmp_path, "b.npy", 100, 2)
+    newer = _entry(tmp_path, "c.npy", 100, 3)
+    keep = _entry(tmp_path, "d.npy", 100, 4)
+
+    unlink = pathlib.Path.unlink
+
+    def locked_unlink(self, *args, **kwargs):
+        if self == locked:
+            raise PermissionError(13, "file is memory-mapped", str(self))
+        return unlink(self, *args, **kwargs)
+
+    monkeypatch.setattr(pathlib.Path, "unlink", locked_unlink)
+    audio_cache._evict(tmp_path, budget=200, keep=keep)
+
+    # The locked entry stays and eviction carries on past it until the
+    # remaining entries fit the budget.
+    assert locked.exists()
+    assert not older.exists()
+    assert not newer.exists()
+    assert keep.exists()
+
+
+def test_evict_removes_stale_temp_files_only(tmp_path):
+    now = int(time.time())
+    stale = _entry(tmp_path, "tmpabc123.tmp", 100, now - int(audio_cache.STALE_TMP_SECONDS) - 60)
+    writing = _entry(tmp_path, "tmpdef456.tmp", 100, now)
+    keep = _entry(tmp_path, "a.npy", 100, now)
+
+    audio_cache._evict(tmp_path, budget=10_000, keep=keep)
+
+    assert not stale.exists()
+    assert writing.exists()
+    assert keep.exists()
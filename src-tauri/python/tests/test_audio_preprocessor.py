@@ -0,0 +1,188 @@
+import argparse
+import io
+import json
+import pathlib
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+import soundfile
+import torch
+
+import audio_preprocessor as ap
+
+
+class _SoundfileAudio:
+    """Stand-in for demucs' ffmpeg-backed AudioFile, so the test needs no ffmpeg."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def read(self, streams, samplerate, channels):
+        try:
+            data, sr = soundfile.read(str(self.path), dtype="float32", always_2d=True)
+        except soundfile.LibsndfileError:
+            raise subprocess.CalledProcessError(1, "ffmpeg")
+        return ap.convert_audio(torch.from_numpy(data.T.copy()), sr, samplerate, channels)
+
+
+def _corrupt(path):
+    path.write_bytes(b"ID3\x04not really an mp3" * 64)
+    return path
+
+
+def test_load_track_raises_instead_of_exiting(tmp_path):
+    with pytest.raises(RuntimeError, match="Could not load"):
+        ap._load_track(_corrupt(tmp_path / "broken.mp3"), 2, 44100)
+
+
+def test_manifest_keeps_serving_after_a_corrupt_track(tmp_path, monkeypatch):
+    monkeypatch.setattr(ap, "AudioFile", _SoundfileAudio)
+    monkeypatch.setenv("LUMA_STEM_CACHE", "0")
+    monkeypatch.setenv("LUMA_AUDIO_CACHE", "0")
+
+    good = tmp_path / "good.wav"
+    t = np.arange(2 * 44100) / 44100
+    soundfile.write(good, np.stack([np.sin(2 * np.pi * 110 * t)] * 2, axis=1) * 0.3, 44100)
+    jobs = [
+        {"id": 1, "audio_file": str(_corrupt(tmp_path / "broken.mp3")), "target_dir": str(tmp_path / "out1")},
+        {"id": 2, "audio_file": str(good), "target_dir": str(tmp_path / "out2")},
+    ]
+    stdin = io.StringIO("".join(json.dumps(job) + "\n" for job in jobs))
+    stdout = io.StringIO()
+    monkeypatch.setattr(sys, "stdin", stdin)
+    monkeypatch.setattr(sys, "stdout", stdout)
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["audio_preprocessor.py", "--manifest", "--model", "demucs_unittest", "--device", "cpu",
+         "--shifts", "0", "--autotune", "off", "--progress-fd", "-1"],
+    )
+
+    args = ap.parse_args()
+    assert ap.run_manifest(args, ap.progress_events(args)) == 0
+
+    first, second = [json.loads(line) for line in stdout.getvalue().splitlines()]
+    assert first["id"] == 1 and "Could not load" in first["error"]
+    assert second["id"] == 2 and "error" not in second
+    assert second["stems"]
+
+
+def test_unknown_stem_is_a_json_error(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(ap, "AudioFile", _SoundfileAudio)
+    monkeypatch.setenv("LUMA_STEM_CACHE", "0")
+    monkeypatch.setenv("LUMA_AUDIO_CACHE", "0")
+    track = tmp_path / "track.wav"
+    soundfile.write(track, np.zeros((44100, 2), dtype=np.float32), 44100)
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["audio_preprocessor.py", str(track), str(tmp_path / "out"), "--stems", "bass,piano",
+         "--model", "demucs_unittest", "--device", "cpu", "--shifts", "0", "--autotune", "off",
+         "--progress-fd", "-1"],
+    )
+
+    assert ap.main() == 1
+
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    error = json.loads(captured.err.strip().splitlines()[-1])["error"]
+    assert "Unknown stem(s) piano" in error
+
+
+def _decode_blocks(audio_path, sample_rate, channels, block_frames):
+    """Stand-in for the ffmpeg pipe in `_decode_pcm` (input is already at `sample_rate`)."""
+    data, _ = soundfile.read(str(audio_path), dtype="float32", always_2d=True)
+    for start in range(0, len(data), block_frames):
+        yield torch.from_numpy(data[start : start + block_frames].T.copy())
+
+
+@pytest.mark.parametrize("threshold, saved", [(ap.CHUNK_CHECKPOINT_SECONDS, False), (0.0, True)])
+def test_stream_checkpoints_chunks_only_for_long_tracks(tmp_path, monkeypatch, threshold, saved):
+    monkeypatch.setattr(ap, "_decode_pcm", _decode_blocks)
+    monkeypatch.setattr(ap, "CHUNK_CHECKPOINT_SECONDS", threshold)
+    engine = ap.SeparationEngine("demucs_unittest", "cpu", shifts=0, progress=False)
+    track = tmp_path / "track.wav"
+    t = np.arange(6 * engine.samplerate) / engine.samplerate
+    soundfile.write(track, np.stack([np.sin(2 * np.pi * 110 * t)] * 2, axis=1) * 0.3, engine.samplerate)
+
+    checkpoint = ap.Checkpoint(tmp_path / "stems", {"audio": str(track)})
+    blocks = list(engine.iter_separated(track, ["bass"], 2.0, 0.5, checkpoint=checkpoint))
+
+    assert sum(block["bass"].shape[-1] for block in blocks) == len(t)
+    assert any(checkpoint.chunks.glob("*/done")) is saved
+
+
+def test_interrupted_stream_resumes_from_saved_chunks(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(ap, "_decode_pcm", _decode_blocks)
+    monkeypatch.setattr(ap, "CHUNK_CHECKPOINT_SECONDS", 0.0)
+    monkeypatch.setenv("LUMA_STEM_CACHE", "0")
+    track = tmp_path / "track.wav"
+    t = np.arange(9 * 44100) / 44100
+    soundfile.write(track, np.stack([np.sin(2 * np.pi * 110 * t)] * 2, axis=1) * 0.3, 44100)
+    target = tmp_path / "stems"
+    staging = ap.Checkpoint.staging_path(target)
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["audio_preprocessor.py", str(track), str(target), "--stream", "--chunk-seconds", "2",
+         "--chunk-overlap", "0.5", "--model", "demucs_unittest", "--device", "cpu", "--shifts", "0",
+         "--autotune", "off", "--progress-fd", "-1"],
+    )
+
+    apply_model = ap.apply_model
+    calls = []
+
+    def interrupted_after(limit):
+        def run(*args, **kwargs):
+            if len(calls) == limit:
+                raise KeyboardInterrupt
+            calls.append(1)
+            return apply_model(*args, **kwargs)
+
+        return run
+
+    # 9 s in 1.5 s strides is six chunks; the process dies while separating the fourth.
+    monkeypatch.setattr(ap, "apply_model", interrupted_after(3))
+    with pytest.raises(KeyboardInterrupt):
+        ap.main()
+    assert not target.exists()
+    assert sorted(p.parent.name for p in staging.glob("chunks/*/done")) == ["00000", "00001", "00002"]
+
+    calls.clear()
+    monkeypatch.setattr(ap, "apply_model", interrupted_after(None))
+    capsys.readouterr()
+    assert ap.main() == 0
+
+    assert len(calls) == 3
+    assert not staging.exists()
+    payload = json.loads(capsys.readouterr().out)
+    published = sorted(p.name for p in target.iterdir())
+    assert published == sorted(pathlib.Path(stem["path"]).name for stem in payload["stems"])
+    for stem in payload["stems"]:
+        path = pathlib.Path(stem["path"])
+        assert path.parent == target
+        if path.suffix == ".wav":  # Opus output is resampled to 48 kHz
+            assert soundfile.info(str(path)).frames == len(t)
+
+
+def test_autotune_benchmarks_once_and_reuses_the_cached_threads(tmp_path, monkeypatch):
+    monkeypatch.setattr(ap, "_tuning_path", lambda: tmp_path / "demucs_tuning.json")
+    runs = []
+
+    def fake_benchmark(engine, clip, threads):
+        runs.append(threads)
+        return {8: 3.0, 4: 2.0, 2: 2.5}[threads]
+
+    monkeypatch.setattr(ap, "_benchmark", fake_benchmark)
+    engine = argparse.Namespace(
+        model_name="htdemucs", device="cpu", audio_channels=2, samplerate=44100, default_segment=1.0
+    )
+
+    assert ap.autotune(engine, cores=8)["threads"] == 4
+    assert sorted(set(runs)) == [2, 4, 8]
+    runs.clear()
+    assert ap.autotune(engine, cores=8)["threads"] == 4
+    assert runs == []
+    assert ap.autotune(argparse.Namespace(**{**vars(engine), "device": "cuda"}), cores=8) == {}
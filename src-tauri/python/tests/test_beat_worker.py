@@ -0,0 +1,273 @@
+"""Regression tests for beat_worker, on seeded synthetic logits."""
+
+import pathlib
+import warnings
+
+import numpy as np
+import pytest
+
+import beat_worker
+
+HOP = beat_worker.HOP_SECONDS
+
+
+def _reference_score_grid(beat_probs, times, duration, bpm, phases):
+    # Frozen copy of the original per-phase loop that `_score_grid` batches.
+    period = 60.0 / bpm
+    best_phase, best_score = 0.0, -np.inf
+    for phase in phases:
+        grid_times = np.arange(phase, duration, period)
+        if len(grid_times) == 0:
+            continue
+        vals = np.interp(grid_times, times, beat_probs, left=0.0, right=0.0)
+        score = float(vals.mean())
+        if score > best_score:
+            best_score, best_phase = score, float(phase)
+    return best_phase, best_score
+
+
+def _synthetic_logits(rng, n_frames, bpm, phase, noise):
+    beat = np.full(n_frames, -6.0) + rng.normal(0.0, noise, n_frames)
+    downbeat = np.full(n_frames, -7.0) + rng.normal(0.0, noise, n_frames)
+    for k, t in enumerate(np.arange(phase, n_frames * HOP, 60.0 / bpm)):
+        i = int(round(t / HOP))
+        if i < n_frames:
+            beat[i] = 4.0 + rng.normal()
+            if k % 4 == 0:
+                downbeat[i] = 3.0
+    return beat, downbeat
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_batched_score_grid_matches_per_phase_loop(seed):
+    rng = np.random.default_rng(seed)
+    n_frames = int(rng.integers(5, 4000))
+    beat, _ = _synthetic_logits(rng, n_frames, rng.uniform(70, 170), rng.uniform(0, 1), rng.uniform(0, 3))
+    probs = beat_worker._sigmoid_array(beat)
+    times = np.arange(n_frames) * HOP
+    duration = times[-1]
+
+    bpms = np.arange(70.0, 170.0 + 1e-6, 1.0)
+    coarse = np.linspace(0, 60.0 / bpms, num=24, endpoint=False, axis=1)
+    centre = rng.uniform(0, 0.5)
+    fine_bpms = np.arange(110.0, 118.0, 0.1)
+    periods = 60.0 / fine_bpms
+    fine = np.linspace(centre - 0.25 * periods, centre + 0.25 * periods, num=48, endpoint=False, axis=1)
+
+    for grid, phases in ((bpms, coarse), (fine_bpms, fine)):
+        best_phase, best_score = beat_worker._score_grid(probs, times, duration, grid, phases)
+        for row, bpm in enumerate(grid):
+            phase, score = _reference_score_grid(probs, times, duration, bpm, phases[row])
+            assert best_phase[row] == phase
+            assert best_score[row] == score
+
+
+def test_score_grid_empty_grids_score_minus_infinity():
+    times = np.arange(3) * HOP
+    phases = np.array([[1.0, 2.0]])
+    best_phase, best_score = beat_worker._score_grid(np.ones(3), times, times[-1], np.array([120.0]), phases)
+    assert best_score[0] == -np.inf
+    assert best_phase[0] == 0.0
+
+
+def _reference_phase_sweep(beat_probs, times, duration, bpm):
+    # Frozen copy of the original coarse (24) + fine (48, +-0.25 period) phase sweep.
+    period = 60.0 / bpm
+    phase, score = _reference_score_grid(
+        beat_probs, times, duration, bpm, np.linspace(0, period, num=24, endpoint=False)
+    )
+    fine = np.linspace(phase - 0.25 * period, phase + 0.25 * period, num=48, endpoint=False)
+    fine_phase, fine_score = _reference_score_grid(beat_probs, times, duration, bpm, fine)
+    return fine_phase if fine_score > score else phase
+
+
+def _phase_error(phase, truth, period):
+    return abs((phase - truth + period / 2) % period - period / 2)
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_fold_phase_is_at_least_as_accurate_as_phase_sweep(seed):
+    rng = np.random.default_rng(seed)
+    bpm = rng.uniform(70, 170)
+    period = 60.0 / bpm
+    truth = rng.uniform(0, period)
+    beat, _ = _synthetic_logits(rng, 3000, bpm, truth, rng.uniform(0, 2))
+    probs = beat_worker._sigmoid_array(beat)
+    times = np.arange(len(probs)) * HOP
+
+    folded = beat_worker._fold_phase(probs, times, np.array([period]))[0]
+    swept = _reference_phase_sweep(probs, times, times[-1], bpm)
+
+    assert 0.0 <= folded < period
+    assert _phase_error(folded, truth, period) <= HOP / 2
+    assert _phase_error(folded, truth, period) <= _phase_error(swept, truth, period) + HOP / 4
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_first_beat_at_zero_is_kept(seed):
+    rng = np.random.default_rng(seed)
+    bpm = rng.uniform(70, 170)
+    beat, downbeat = _synthetic_logits(rng, 3000, bpm, 0.0, 1.0)
+    probs = beat_worker._sigmoid_array(beat)
+    times = np.arange(len(probs)) * HOP
+
+    assert beat_worker._fold_phase(probs, times, np.array([60.0 / bpm]))[0] < HOP
+    result = beat_worker.fixed_bpm_from_logits(beat, downbeat, HOP)
+    assert result.beats[0] < HOP
+
+
+BPM_GRID = np.arange(70.0, 170.0 + 1e-6, 1.0)
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_tempo_candidates_keep_the_true_tempo(seed, monkeypatch):
+    rng = np.random.default_rng(seed)
+    bpm = rng.uniform(70, 170)
+    beat, downbeat = _synthetic_logits(rng, 3000, bpm, rng.uniform(0, 0.5), rng.uniform(0, 2))
+    probs = beat_worker._sigmoid_array(beat)
+
+    candidates, confidence = beat_worker._tempo_candidates(probs, HOP, BPM_GRID)
+
+    assert confidence >= beat_worker.TEMPO_MIN_CONFIDENCE
+    assert len(candidates) < len(BPM_GRID)
+    assert np.abs(candidates - bpm).min() <= 1.0
+    # The pruned search is never further from the truth than the full sweep
+    # (which can itself land on a tempo octave).
+    pruned = beat_worker.fixed_bpm_from_logits(beat, downbeat, HOP)
+    monkeypatch.setattr(beat_worker, "_tempo_candidates", lambda probs, hop, grid: (grid, 0.0))
+    full = beat_worker.fixed_bpm_from_logits(beat, downbeat, HOP)
+    assert abs(pruned.bpm - bpm) <= abs(full.bpm - bpm) + 0.1
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_tempo_candidates_fall_back_to_full_grid_on_noise(seed):
+    rng = np.random.default_rng(seed)
+    probs = beat_worker._sigmoid_array(rng.normal(-3.0, 2.0, 3000))
+    candidates, confidence = beat_worker._tempo_candidates(probs, HOP, BPM_GRID)
+    assert confidence < beat_worker.TEMPO_MIN_CONFIDENCE
+    assert np.array_equal(candidates, BPM_GRID)
+
+
+@pytest.mark.parametrize("probs", [np.full(3000, 0.01), np.zeros(1), np.zeros(0)])
+def test_tempo_candidates_fall_back_to_full_grid_on_silence(probs):
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        candidates, confidence = beat_worker._tempo_candidates(probs, HOP, BPM_GRID)
+    assert confidence == 0.0
+    assert np.array_equal(candidates, BPM_GRID)
+
+
+@pytest.fixture
+def fake_inference(monkeypatch, tmp_path):
+    import audio_cache
+
+    rng = np.random.default_rng(0)
+    logits = _synthetic_logits(rng, 1500, 120.0, 0.1, 0.5)
+    monkeypatch.setattr(audio_cache, "load", lambda path, sr: np.zeros(sr, dtype=np.float32))
+    monkeypatch.setattr(beat_worker, "stream_logits", lambda tracker, signal: logits)
+    audio = tmp_path / "music" / "track.wav"
+    audio.parent.mkdir()
+    audio.write_bytes(b"RIFF not really audio")
+    return audio, logits
+
+
+def test_saved_logits_live_in_cache_dir_keyed_by_content(fake_inference, tmp_path, monkeypatch):
+    audio, (beat, downbeat) = fake_inference
+    monkeypatch.setenv("LUMA_BEAT_LOGITS_DIR", str(tmp_path / "cache"))
+
+    payload = beat_worker.analyse(None, audio, 70.0, 170.0, keep_logits=True)
+
+    sidecar = pathlib.Path(payload["logits_path"])
+    assert sidecar.parent == tmp_path / "cache"
+    assert list(audio.parent.iterdir()) == [audio]
+    copy = tmp_path / "renamed.wav"
+    copy.write_bytes(audio.read_bytes())
+    assert beat_worker.logits_sidecar(copy, "final0") == sidecar
+    saved_beat, saved_downbeat = beat_worker.load_logits(sidecar)
+    np.testing.assert_allclose(saved_beat, beat.astype(np.float16))
+    np.testing.assert_allclose(saved_downbeat, downbeat.astype(np.float16))
+
+
+def test_unwritable_logits_dir_only_warns(fake_inference, tmp_path, monkeypatch, capsys):
+    audio, _ = fake_inference
+    blocked = tmp_path / "not-a-dir"
+    blocked.write_text("")
+    monkeypatch.setenv("LUMA_BEAT_LOGITS_DIR", str(blocked))
+
+    payload = beat_worker.analyse(None, audio, 70.0, 170.0, keep_logits=True)
+
+    assert "logits_path" not in payload
+    assert payload["beats"]
+    assert "could not save logits" in capsys.readouterr().err
+
+
+class _StubTracker:
+    """`Audio2Frames` stand-in: the real log-mel front end with a position-aware frame model."""
+
+    def __init__(self):
+        import torch
+        from beat_this.preprocessing import LogMelSpect
+
+        self.device = torch.device("cpu")
+        self.float16 = False
+        self.spect = LogMelSpect(device=self.device)
+        self.model = self._frame_model
+
+    @staticmethod
+    def _frame_model(x):
+        import torch
+
+        # A frame's output depends on where it sits in the window, so any
+        # drift in window starts or stitching shows up in the comparison.
+        pos = torch.arange(x.shape[1], dtype=x.dtype)
+        return {"beat": x.mean(-1) + 1e-3 * pos, "downbeat": x[..., 0] - 2e-3 * pos}
+
+
+@pytest.mark.parametrize("n_frames", [40, 1488, 1500, 3001, 4470])
+def test_stream_logits_match_split_predict_aggregate(n_frames):
+    pytest.importorskip("beat_this")
+    import torch
+    from beat_this.inference import split_predict_aggregate
+
+    rng = np.random.default_rng(n_frames)
+    signal = (0.1 * rng.standard_normal((n_frames - 1) * beat_worker.HOP_SAMPLES + 200)).astype(np.float32)
+    tracker = _StubTracker()
+
+    beat, downbeat = beat_worker.stream_logits(tracker, signal)
+
+    with torch.inference_mode():
+        spect = tracker.spect(torch.from_numpy(signal))
+        expected = split_predict_aggregate(
+            spect, beat_worker.CHUNK_FRAMES, beat_worker.BORDER_FRAMES, "keep_first", tracker.model
+        )
+    assert len(beat) == spect.shape[0] == n_frames
+    np.testing.assert_allclose(beat, expected["beat"].numpy(), atol=1e-4)
+    np.testing.assert_allclose(downbeat, expected["downbeat"].numpy(), atol=1e-4)
+
+
+def _two_tempo_logits(rng, change, duration, bpms, noise=0.5):
+    """Logits at bpms[0] until `change` seconds, then at bpms[1] from a beat placed at `change`."""
+    n_frames = int(duration / HOP)
+    beat, downbeat = _synthetic_logits(rng, n_frames, bpms[0], 0.2, noise)
+    split = int(round(change / HOP))
+    tail_beat, tail_downbeat = _synthetic_logits(rng, n_frames - split, bpms[1], 0.0, noise)
+    beat[split:], downbeat[split:] = tail_beat, tail_downbeat
+    return beat, downbeat
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("change, bpms", [(37.3, (100.0, 140.0)), (29.0, (128.0, 96.0))])
+def test_variable_tempo_finds_the_change_point_and_both_tempi(seed, change, bpms):
+    rng = np.random.default_rng(seed)
+    beat, downbeat = _two_tempo_logits(rng, change, 75.0, bpms)
+
+    result = beat_worker.variable_bpm_from_logits(beat, downbeat, HOP)
+
+    first, second = result.tempo_segments
+    assert first.bpm == pytest.approx(bpms[0], abs=0.3)
+    assert second.bpm == pytest.approx(bpms[1], abs=0.3)
+    # Resolved to the beat, not to the 8 s scoring window.
+    assert abs(second.start - change) < 0.5 * 60.0 / max(bpms)
+    assert first.end == second.start
+    beats = np.asarray(result.beats)
+    assert np.all(np.diff(beats) > 0.5 * 60.0 / max(bpms))
@@ -0,0 +1,215 @@
+import argparse
+import copy
+
+import numpy as np
+import pytest
+import torch
+
+import classifier_worker as cw
+
+SR = cw.MERT_TARGET_SR
+
+
+def _tiny_config():
+    from transformers import HubertConfig
+
+    return HubertConfig(
+        hidden_size=32,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        intermediate_size=64,
+        conv_dim=(32,) * 7,
+        num_conv_pos_embeddings=16,
+        num_conv_pos_embedding_groups=4,
+    )
+
+
+@pytest.fixture(scope="module")
+def tiny_models():
+    """A MERT-shaped encoder small enough for unit tests, with a matching head."""
+    from transformers import HubertModel, Wav2Vec2FeatureExtractor
+
+    torch.manual_seed(0)
+    mert = HubertModel(_tiny_config()).eval()
+    processor = Wav2Vec2FeatureExtractor(
+        feature_size=1, sampling_rate=SR, padding_value=0.0, do_normalize=True, return_attention_mask=True
+    )
+    head = cw.build_bar_classifier(input_dim=32, hidden_dim=16, n_tags=len(cw.LEGACY_TAG_ORDER), dropout=0.0)
+    return mert, processor, head.eval()
+
+
+def _args(**overrides):
+    defaults = {"batch": 4, "batch_seconds": 16.0, "window_seconds": 6.0, "window_context": 1.0}
+    return argparse.Namespace(**{**defaults, **overrides})
+
+
+def _track(seconds: float) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * SR)) / SR
+    return (0.3 * np.sin(2 * np.pi * 110 * t) + 0.05 * rng.standard_normal(t.shape)).astype(np.float32)
+
+
+def test_windowed_encoder_scores_every_bar_once(tiny_models):
+    y = _track(20.0)
+    # Uneven bars, one too short to score, and one running past the end.
+    boundaries = [[0.0, 1.7], [1.7, 1.72], [1.72, 4.0]] + [[4.0 + 2 * i, 6.0 + 2 * i] for i in range(7)] + [[18.0, 21.0]]
+    spans = cw._bar_spans(boundaries, len(y))
+
+    windowed = cw._classify_windowed(tiny_models, "cpu", y, spans, _args())
+
+    assert sorted(bar["bar_idx"] for bar in windowed) == [span[0] for span in spans]
+    assert 1 not in {bar["bar_idx"] for bar in windowed}
+    for bar in windowed:
+        assert set(bar["predictions"]) == {"intensity", *cw.LEGACY_TAG_ORDER}
+
+
+def test_prediction_deltas_of_windowed_against_per_bar(tiny_models):
+    y = _track(20.0)
+    spans = cw._bar_spans([[2.0 * i, 2.0 * (i + 1)] for i in range(10)], len(y))
+    per_bar = cw._classify_per_bar(tiny_models, "cpu", y, spans, _args())
+    windowed = cw._classify_windowed(tiny_models, "cpu", y, spans, _args())
+
+    deltas = cw._prediction_deltas(per_bar, windowed)
+    assert deltas["bars"] == len(spans)
+    assert 0.0 <= deltas["tag_decision_agreement"] <= 1.0
+    assert deltas["tag_max_abs"] <= 1.0
+    assert np.isfinite(deltas["intensity_mae"])
+
+    same = cw._prediction_deltas(per_bar, per_bar)
+    assert same["intensity_max_abs"] == 0.0
+    assert same["tag_max_abs"] == 0.0
+    assert same["tag_decision_agreement"] == 1.0
+
+
+def test_prediction_deltas_needs_shared_bars():
+    bar = {"bar_idx": 0, "predictions": {"intensity": 1.0, **{t: 0.5 for t in cw.LEGACY_TAG_ORDER}}}
+    with pytest.raises(ValueError):
+        cw._prediction_deltas([bar], [{**bar, "bar_idx": 1}])
+
+
+@pytest.fixture
+def tiny_pretrained(monkeypatch):
+    """Serve the tiny encoder from transformers' Auto* loaders instead of the hub."""
+    import transformers
+    from transformers import HubertModel
+
+    calls = {"from_pretrained": 0}
+
+    def from_pretrained(*_args, **_kwargs):
+        calls["from_pretrained"] += 1
+        torch.manual_seed(0)
+        return HubertModel(_tiny_config())
+
+    monkeypatch.setattr(transformers.AutoModel, "from_pretrained", from_pretrained)
+    monkeypatch.setattr(transformers.AutoModel, "from_config", lambda config, **_kw: HubertModel(config))
+    monkeypatch.setattr(transformers.AutoConfig, "from_pretrained", lambda *_a, **_kw: _tiny_config())
+    return calls
+
+
+def test_quantized_mert_is_cached_and_reloaded(tiny_pretrained, tmp_path):
+    cache_path = tmp_path / "mert_int8.pt"
+    built = cw._load_quantized_mert(cache_path)
+    assert cache_path.exists()
+    assert not list(tmp_path.glob("*.tmp"))
+
+    reloaded = cw._load_quantized_mert(cache_path)
+    assert tiny_pretrained["from_pretrained"] == 1
+    assert any("quantized" in type(m).__module__ for m in reloaded.modules())
+
+    x = torch.from_numpy(_track(1.0))[None]
+    with torch.no_grad():
+        assert torch.equal(built(x).last_hidden_state, reloaded(x).last_hidden_state)
+
+
+def test_quantized_mert_survives_unwritable_cache(tiny_pretrained, tmp_path):
+    cache_path = tmp_path / "missing" / "mert_int8.pt"
+    mert = cw._load_quantized_mert(cache_path)
+    assert mert is not None
+    assert not cache_path.exists()
+
+
+def test_quantized_mert_rebuilds_corrupt_cache(tiny_pretrained, tmp_path):
+    cache_path = tmp_path / "mert_int8.pt"
+    cache_path.write_bytes(b"not a state dict")
+    cw._load_quantized_mert(cache_path)
+    assert tiny_pretrained["from_pretrained"] == 1
+    cw._load_quantized_mert(cache_path)
+    assert tiny_pretrained["from_pretrained"] == 1
+
+
+@pytest.mark.parametrize(
+    "intensity, tag, ok",
+    [
+        (cw.QUANT_MAX_INTENSITY_DELTA, cw.QUANT_MAX_TAG_DELTA, True),
+        (cw.QUANT_MAX_INTENSITY_DELTA + 1e-3, 0.0, False),
+        (0.0, cw.QUANT_MAX_TAG_DELTA + 1e-3, False),
+    ],
+)
+def test_quantization_tolerance_thresholds(intensity, tag, ok):
+    assert cw.within_quantization_tolerance({"intensity_max_abs": intensity, "tag_max_abs": tag}) is ok
+
+
+def test_reference_clip_is_deterministic():
+    y, boundaries = cw.reference_clip()
+    again, _ = cw.reference_clip()
+    assert y.dtype == np.float32
+    assert np.array_equal(y, again)
+    assert boundaries[-1][1] * SR == pytest.approx(len(y))
+    assert 0.0 < np.abs(y).max() <= 0.5
+
+
+def test_check_quantization_on_reference_clip(tiny_models, monkeypatch):
+    from torch import nn
+    from torch.ao.quantization import quantize_dynamic
+
+    mert, processor, head = tiny_models
+    int8 = (
+        quantize_dynamic(copy.deepcopy(mert), {nn.Linear}, dtype=torch.qint8),
+        processor,
+        quantize_dynamic(copy.deepcopy(head), {nn.Linear}, dtype=torch.qint8),
+    )
+    monkeypatch.setattr(cw, "load_models", lambda _weights, _device, quantize=False: int8 if quantize else tiny_models)
+
+    y, boundaries = cw.reference_clip(bars=4)
+    report = cw.check_quantization(y, boundaries, _args(weights_file=None, encode="bar"))
+
+    assert report["bars"] == 4
+    assert set(report["seconds"]) == {"fp32", "int8"}
+    assert report["within_tolerance"] == cw.within_quantization_tolerance(report)
+    assert report["intensity_max_abs"] <= cw.QUANT_MAX_INTENSITY_DELTA
+    assert report["tag_max_abs"] <= cw.QUANT_MAX_TAG_DELTA
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("max_samples, max_bars", [(10_000, 4), (3_000, 32), (1, 8)])
+def test_schedule_batches_respects_bounds_and_covers_every_bar_once(seed, max_samples, max_bars):
+    lengths = np.random.default_rng(seed).integers(200, 2_000, size=37).tolist()
+
+    batches = cw.schedule_batches(lengths, max_samples, max_bars)
+
+    assert sorted(i for batch in batches for i in batch) == list(range(len(lengths)))
+    for batch in batches:
+        assert 1 <= len(batch) <= max_bars
+        # Only a bar that alone exceeds the budget may break it, and then it runs alone.
+        assert len(batch) * max(lengths[i] for i in batch) <= max_samples or len(batch) == 1
+    # Batches are packed shortest first, so no batch pads above the next one's shortest bar.
+    for batch, following in zip(batches, batches[1:]):
+        assert max(lengths[i] for i in batch) <= min(lengths[i] for i in following)
+
+
+def test_schedule_batches_empty():
+    assert cw.schedule_batches([], 1_000, 4) == []
+
+
+def test_per_bar_results_map_back_to_their_bars(tiny_models):
+    y = _track(20.0)
+    # Lengths deliberately out of order so batching reorders the bars.
+    edges = np.cumsum([0.0, 3.0, 0.6, 2.2, 0.9, 4.0, 1.3, 0.7, 2.5])
+    boundaries = [[float(a), float(b)] for a, b in zip(edges, edges[1:])]
+    spans = cw._bar_spans(boundaries, len(y))
+
+    bars = cw._classify_per_bar(tiny_models, "cpu", y, spans, _args(batch=3, batch_seconds=4.0))
+
+    assert sorted(bar["bar_idx"] for bar in bars) == list(range(len(boundaries)))
+    for bar in bars:
+        assert [bar["start"], bar["end"]] == boundaries[bar["bar_idx"]]
@@ -0,0 +1,123 @@
+import os
+import pathlib
+
+import pytest
+
+import stem_cache
+
+SOURCES = ["drums", "bass", "other", "vocals"]
+
+
+@pytest.fixture
+def store_dir(tmp_path, monkeypatch):
+    directory = tmp_path / "store"
+    monkeypatch.setenv("LUMA_STEM_CACHE_DIR", str(directory))
+    monkeypatch.delenv("LUMA_STEM_CACHE", raising=False)
+    monkeypatch.delenv("LUMA_STEM_CACHE_MAX_BYTES", raising=False)
+    return directory
+
+
+def _separated(directory: pathlib.Path, tag: str, size: int = 100) -> dict[str, pathlib.Path]:
+    directory.mkdir(parents=True, exist_ok=True)
+    files = {}
+    for name in SOURCES:
+        path = directory / f"{name}.wav"
+        path.write_bytes(f"{tag}:{name}:".encode().ljust(size, b"\0"))
+        files[name] = path
+    return files
+
+
+def _age(entry: pathlib.Path, mtime: int) -> None:
+    os.utime(entry / stem_cache.MANIFEST_NAME, (mtime, mtime))
+
+
+def test_store_lookup_and_materialize_a_subset(store_dir, tmp_path):
+    files = _separated(tmp_path / "run", "a")
+    key = stem_cache.entry_key("hash-a", "htdemucs", {"shifts": 0})
+    stem_cache.store(key, files, SOURCES)
+
+    hit = stem_cache.lookup(key, ["bass", "vocals"])
+    assert hit is not None
+    stored, sources = hit
+    assert sources == SOURCES
+    assert set(stored) == {"bass", "vocals"}
+
+    target = tmp_path / "track" / "stems"
+    stem_cache.materialize(stored, target)
+    assert sorted(p.name for p in target.iterdir()) == ["bass.wav", "vocals.wav"]
+    assert (target / "bass.wav").read_bytes() == files["bass"].read_bytes()
+
+    assert stem_cache.lookup(key, ["bass", "piano"]) is None
+    assert stem_cache.lookup(stem_cache.entry_key("hash-a", "htdemucs", {"shifts": 1})) is None
+
+
+def test_lookup_drops_a_modified_entry(store_dir, tmp_path):
+    key = stem_cache.entry_key("hash-a", "htdemucs", {})
+    stem_cache.store(key, _separated(tmp_path / "run", "a"), SOURCES)
+    stored, _ = stem_cache.lookup(key)
+    stored["drums"].unlink()
+    stored["drums"].write_bytes(b"x" * 100)
+
+    assert stem_cache.lookup(key) is None
+    assert not (store_dir / key).exists()
+
+
+@pytest.mark.parametrize(
+    "link_fails, reflink_works, expected",
+    [(False, False, "hardlink"), (True, True, "reflink"), (True, False, "copy")],
+)
+def test_place_falls_back_from_hardlink_to_reflink_to_copy(tmp_path, monkeypatch, link_fails, reflink_works, expected):
+    src = tmp_path / "bass.wav"
+    src.write_bytes(b"bass" * 25)
+    dst = tmp_path / "out.wav"
+
+    if link_fails:
+
+        def no_link(*_args):
+            raise OSError(18, "cross-device link")
+
+        monkeypatch.setattr(stem_cache.os, "link", no_link)
+
+    def fake_reflink(source, target):
+        if not reflink_works:
+            return False
+        target.write_bytes(source.read_bytes())
+        return True
+
+    monkeypatch.setattr(stem_cache, "_reflink", fake_reflink)
+
+    assert stem_cache._place(src, dst) == expected
+    assert dst.read_bytes() == src.read_bytes()
+    assert (dst.stat().st_ino == src.stat().st_ino) == (expected == "hardlink")
+
+
+def test_store_evicts_least_recently_used_entries_past_the_budget(store_dir, tmp_path, monkeypatch):
+    # Each entry holds four 100-byte stems plus a ~400-byte manifest: two fit, three don't.
+    monkeypatch.setenv("LUMA_STEM_CACHE_MAX_BYTES", "2000")
+    keys = [stem_cache.entry_key(f"hash-{tag}", "htdemucs", {}) for tag in "abc"]
+    for mtime, (tag, key) in enumerate(zip("ab", keys), start=1):
+        stem_cache.store(key, _separated(tmp_path / tag, tag), SOURCES)
+        _age(store_dir / key, mtime)
+
+    # A hit makes "a" the most recently used entry, so "b" goes first.
+    assert stem_cache.lookup(keys[0]) is not None
+    stem_cache.store(keys[2], _separated(tmp_path / "c", "c"), SOURCES)
+
+    assert stem_cache.lookup(keys[1]) is None
+    assert stem_cache.lookup(keys[0]) is not None
+    assert stem_cache.lookup(keys[2]) is not None
+
+
+def test_store_keeps_the_new_entry_even_over_budget(store_dir, tmp_path, monkeypatch):
+    monkeypatch.setenv("LUMA_STEM_CACHE_MAX_BYTES", "10")
+    key = stem_cache.entry_key("hash-a", "htdemucs", {})
+    stem_cache.store(key, _separated(tmp_path / "run", "a"), SOURCES)
+    assert stem_cache.lookup(key) is not None
+
+
+def test_disabled_store_is_bypassed(store_dir, tmp_path, monkeypatch):
+    monkeypatch.setenv("LUMA_STEM_CACHE", "0")
+    key = stem_cache.entry_key("hash-a", "htdemucs", {})
+    stem_cache.store(key, _separated(tmp_path / "run", "a"), SOURCES)
+    assert not store_dir.exists()
+    assert stem_cache.lookup(key) is None
@@ -134,6 +134,13 @@ impl TorchInstall {
 // Public API
 // ---------------------------------------------------------------------------
 
+/// Helper modules imported by several workers. Written next to every worker
+/// script so `import <module>` resolves from the script's directory.
+const SHARED_MODULES: &[(&str, &str)] = &[
+    ("audio_cache.py", include_str!("../python/audio_cache.py")),
+    ("stem_cache.py", include_str!("../python/stem_cache.py")),
+];
+
 pub fn ensure_worker_script(
     app: &AppHandle,
     script_name: &str,
@@ -146,6 +153,17 @@ pub fn ensure_worker_script(
     fs::create_dir_all(&cache_dir)
         .map_err(|e| format!("Failed to create cache dir {}: {}", cache_dir.display(), e))?;
 
+    for (module_name, module_source) in SHARED_MODULES {
+        let module_path = cache_dir.join(module_name);
+        fs::write(&module_path, module_source).map_err(|e| {
+            format!(
+                "Failed to write python module {}: {}",
+                module_path.display(),
+                e
+            )
+        })?;
+    }
+
     let script_path = cache_dir.join(script_name);
     fs::write(&script_path, source).map_err(|e| {
         format!(
@@ -500,11 +500,21 @@ pub async fn dj_fast_import(
 /// Reserves 4 GB for the OS/app, then allocates ~3 GB per worker (stems + beats overhead).
 pub(crate) fn analysis_worker_count() -> usize {
     let ram_gb = total_system_memory_gb();
-    let workers = ((ram_gb as i64 - 4) / 3).clamp(1, 6) as usize;
+    let workers = workers_for_memory(ram_gb);
     eprintln!("[background_analysis] {ram_gb} GB RAM → {workers} parallel workers");
     workers
 }
 
+/// `analysis_worker_count` without the log line, for workers that size their
+/// thread pools to their share of the machine.
+pub(crate) fn analysis_worker_slots() -> usize {
+    workers_for_memory(total_system_memory_gb())
+}
+
+fn workers_for_memory(ram_gb: u64) -> usize {
+    ((ram_gb as i64 - 4) / 3).clamp(1, 6) as usize
+}
+
 #[cfg(target_os = "macos")]
 fn total_system_memory_gb() -> u64 {
     use std::mem;
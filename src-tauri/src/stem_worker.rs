@@ -26,6 +26,10 @@ struct StemEntry {
 #[derive(Deserialize)]
 struct WorkerResponse {
     stems: Vec<StemEntry>,
+    /// Per-stage wall/CPU/RSS/IO trailer from the worker (see
+    /// `StageTimings` in audio_preprocessor.py).
+    #[serde(default)]
+    timings: Option<serde_json::Value>,
 }
 
 pub fn separate_stems(
@@ -44,6 +48,14 @@ pub fn separate_stems(
         .arg(target_dir)
         .arg("--model")
         .arg(DEMUCS_MODEL)
+        // Up to this many tracks separate at once; each worker keeps its
+        // torch threads to its share of the cores.
+        .arg("--jobs")
+        .arg(crate::services::tracks::analysis_worker_slots().to_string())
+        // Benchmark thread counts on the first run for this machine and
+        // reuse the cached result (demucs_tuning.json) afterwards.
+        .arg("--autotune")
+        .arg("auto")
         .stdout(Stdio::piped())
         .stderr(Stdio::piped());
 
@@ -76,6 +88,11 @@ pub fn separate_stems(
         let reader = BufReader::new(stderr);
         for line in reader.lines().flatten() {
             log_stem_line(&line);
+            // NDJSON progress events (see `ProgressEvents` in
+            // audio_preprocessor.py) are logged but kept out of the error text.
+            if parse_progress_event(&line).is_some() {
+                continue;
+            }
             stderr_lines_thread.lock().unwrap().push(line);
         }
     });
@@ -120,6 +137,9 @@ pub fn separate_stems(
     if response.stems.is_empty() {
         return Err("Stem worker reported no stems".to_string());
     }
+    if let Some(timings) = &response.timings {
+        log_stem_line(&format!("timings {}", timings));
+    }
 
     Ok(response
         .stems
@@ -131,6 +151,14 @@ pub fn separate_stems(
         .collect())
 }
 
+/// Parses one `{"event": ...}` progress line from the worker's stderr.
+fn parse_progress_event(line: &str) -> Option<serde_json::Value> {
+    if !line.starts_with("{\"event\"") {
+        return None;
+    }
+    serde_json::from_str(line).ok()
+}
+
 fn log_stem_line(message: &str) {
     eprintln!("[stem_worker] {}", message);
 }